@@ -0,0 +1,255 @@
+"""
+Module for evaluating user alert rules against new snapshots
+
+Rules are indexed by symbol (rules for any coin live under ANY) and,
+within a symbol, kept in threshold order. When a symbol's ratio moves
+from `old` to `new`, only the rules whose threshold lies between the two
+values can have been crossed, so they are found by bisecting instead of
+checking every rule: evaluation costs O(log n) per symbol plus the rules
+actually crossed.
+
+A rule that fires is disarmed for that symbol until the ratio falls back
+past the threshold by the hysteresis margin, and it never fires again
+for the same symbol within the cooldown, so a ratio flapping around a
+threshold doesn't flood the chat.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Symbol key for rules that apply to every coin
+ANY = '*'
+
+ABOVE = '>'
+BELOW = '<'
+
+class AlertRule:
+    """One user's alert: `symbol` (or ANY) crossing `threshold` in direction `op`"""
+
+    __slots__ = ('rule_id', 'chat_id', 'symbol', 'op', 'threshold')
+
+    def __init__(self, rule_id: int, chat_id: int, symbol: str, op: str, threshold: float):
+        if op not in (ABOVE, BELOW):
+            raise ValueError(f"Unsupported operator: {op}")
+        self.rule_id = rule_id
+        self.chat_id = chat_id
+        self.symbol = symbol.upper() if symbol != ANY else ANY
+        self.op = op
+        self.threshold = float(threshold)
+
+    def to_dict(self) -> Dict:
+        return {'rule_id': self.rule_id, 'chat_id': self.chat_id, 'symbol': self.symbol,
+                'op': self.op, 'threshold': self.threshold}
+
+    def describe(self) -> str:
+        target = "any coin" if self.symbol == ANY else self.symbol
+        return f"#{self.rule_id}: {target} {self.op} {self.threshold:g}"
+
+class _ThresholdIndex:
+    """Rule IDs in threshold order, sorted lazily after appends"""
+
+    __slots__ = ('thresholds', 'rule_ids', 'dirty')
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.rule_ids: List[int] = []
+        self.dirty = False
+
+    def add(self, threshold: float, rule_id: int) -> None:
+        if not self.dirty and self.thresholds and threshold < self.thresholds[-1]:
+            self.dirty = True
+        self.thresholds.append(threshold)
+        self.rule_ids.append(rule_id)
+
+    def ensure_sorted(self) -> None:
+        if self.dirty:
+            pairs = sorted(zip(self.thresholds, self.rule_ids))
+            self.thresholds = [threshold for threshold, _ in pairs]
+            self.rule_ids = [rule_id for _, rule_id in pairs]
+            self.dirty = False
+
+    def between(self, low: float, high: float, include_low: bool) -> List[int]:
+        """Rule IDs with low < threshold <= high (or low <= threshold < high)."""
+        self.ensure_sorted()
+        if include_low:
+            start = bisect.bisect_left(self.thresholds, low)
+            end = bisect.bisect_left(self.thresholds, high)
+        else:
+            start = bisect.bisect_right(self.thresholds, low)
+            end = bisect.bisect_right(self.thresholds, high)
+        return self.rule_ids[start:end]
+
+class AlertEngine:
+    """
+    Symbol-indexed alert rules evaluated incrementally against snapshots.
+
+    A symbol seen for the first time only sets its baseline. After the
+    first snapshot, a symbol that enters the data counts as rising from 0
+    (it was below the ranking threshold). A symbol that drops out of the
+    data is forgotten rather than treated as a move, and its rules are
+    re-armed; the cooldown still applies.
+    """
+
+    def __init__(self, hysteresis: float = 0.05, cooldown_seconds: float = 3600):
+        self.hysteresis = hysteresis
+        self.cooldown_seconds = cooldown_seconds
+        self.rules: Dict[int, AlertRule] = {}
+        self._by_chat: Dict[int, Set[int]] = {}
+        # symbol -> op -> thresholds
+        self._index: Dict[str, Dict[str, _ThresholdIndex]] = {}
+        self._last: Dict[str, float] = {}
+        self._primed = False
+        # symbol -> IDs of rules that fired and haven't re-armed yet
+        self._disarmed: Dict[str, Set[int]] = {}
+        self._last_fired: Dict[Tuple[int, str], float] = {}
+        self._stale = 0
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add_rule(self, chat_id: int, symbol: str, op: str, threshold: float,
+                 rule_id: Optional[int] = None) -> AlertRule:
+        """
+        Register a rule. If the condition already holds for a symbol, the
+        rule starts disarmed for it, so it fires on the next real crossing.
+        """
+        with self._lock:
+            if rule_id is None:
+                rule_id = self._next_id
+            self._next_id = max(self._next_id, rule_id + 1)
+            rule = AlertRule(rule_id, chat_id, symbol, op, threshold)
+            self.rules[rule_id] = rule
+            self._by_chat.setdefault(chat_id, set()).add(rule_id)
+            self._index.setdefault(rule.symbol, {}).setdefault(rule.op, _ThresholdIndex()).add(
+                rule.threshold, rule_id)
+
+            symbols = self._last if rule.symbol == ANY else [rule.symbol]
+            for symbol in symbols:
+                value = self._last.get(symbol)
+                if value is not None and self._holds(rule, value):
+                    self._disarmed.setdefault(symbol, set()).add(rule_id)
+            return rule
+
+    def add_rules(self, rules: Iterable[AlertRule]) -> None:
+        """Bulk-load rules (e.g. from storage), sorting each index once."""
+        with self._lock:
+            for rule in rules:
+                self.rules[rule.rule_id] = rule
+                self._by_chat.setdefault(rule.chat_id, set()).add(rule.rule_id)
+                self._next_id = max(self._next_id, rule.rule_id + 1)
+                self._index.setdefault(rule.symbol, {}).setdefault(rule.op, _ThresholdIndex()).add(
+                    rule.threshold, rule.rule_id)
+            for by_op in self._index.values():
+                for index in by_op.values():
+                    index.ensure_sorted()
+
+    def remove_rule(self, rule_id: int) -> Optional[AlertRule]:
+        """Remove a rule. Its index entry is skipped until the next compaction."""
+        with self._lock:
+            rule = self.rules.pop(rule_id, None)
+            if rule is not None:
+                self._by_chat.get(rule.chat_id, set()).discard(rule_id)
+                self._stale += 1
+                if self._stale > len(self.rules) + 1024:
+                    self._compact()
+            return rule
+
+    def rules_for_chat(self, chat_id: int) -> List[AlertRule]:
+        """Return a chat's rules in the order they were created."""
+        return [self.rules[rule_id] for rule_id in sorted(self._by_chat.get(chat_id, ()))]
+
+    def evaluate(self, data: List[Dict], now: Optional[float] = None) -> List[Tuple[AlertRule, str, float]]:
+        """
+        Apply a new snapshot and return the alerts it triggers.
+
+        Args:
+            data: Rows with 'symbol' and 'ratio'
+            now: Current time, for cooldowns (default: time.time())
+
+        Returns:
+            A list of (rule, symbol, ratio) for every rule that fired
+        """
+        now = time.time() if now is None else now
+        fired = []
+
+        with self._lock:
+            current = {row['symbol']: float(row.get('ratio', 0) or 0) for row in data}
+            for symbol, new in current.items():
+                old = self._last.get(symbol)
+                if old is None:
+                    if not self._primed:
+                        continue
+                    old = 0.0
+                if new != old:
+                    self._apply_move(symbol, old, new, now, fired)
+
+            for symbol in self._last.keys() - current.keys():
+                self._disarmed.pop(symbol, None)
+            self._last = current
+            self._primed = True
+
+        if fired:
+            logger.info(f"{len(fired)} alerts fired")
+        return fired
+
+    def _apply_move(self, symbol: str, old: float, new: float, now: float,
+                    fired: List[Tuple[AlertRule, str, float]]) -> None:
+        rising = new > old
+        up_rearm = 1 - self.hysteresis
+        down_rearm = 1 + self.hysteresis
+
+        for key in (symbol, ANY):
+            by_op = self._index.get(key)
+            if not by_op:
+                continue
+
+            if rising:
+                # '>' rules crossed on the way up: old <= threshold < new
+                crossed = by_op[ABOVE].between(old, new, include_low=True) if ABOVE in by_op else []
+                # '<' rules re-armed once the ratio is back above threshold * (1 + h)
+                rearmed = (by_op[BELOW].between(old / down_rearm, new / down_rearm, include_low=True)
+                           if BELOW in by_op else [])
+            else:
+                # '<' rules crossed on the way down: new < threshold <= old
+                crossed = by_op[BELOW].between(new, old, include_low=False) if BELOW in by_op else []
+                # '>' rules re-armed once the ratio is back below threshold * (1 - h)
+                rearmed = (by_op[ABOVE].between(new / up_rearm, old / up_rearm, include_low=False)
+                           if ABOVE in by_op and up_rearm > 0 else [])
+
+            disarmed = self._disarmed.setdefault(symbol, set())
+            disarmed.difference_update(rearmed)
+
+            for rule_id in crossed:
+                rule = self.rules.get(rule_id)
+                if rule is None or rule_id in disarmed:
+                    continue
+                state = (rule_id, symbol)
+                last = self._last_fired.get(state)
+                if last is not None and now - last < self.cooldown_seconds:
+                    continue
+                disarmed.add(rule_id)
+                self._last_fired[state] = now
+                fired.append((rule, symbol, new))
+
+    @staticmethod
+    def _holds(rule: AlertRule, value: float) -> bool:
+        return value > rule.threshold if rule.op == ABOVE else value < rule.threshold
+
+    def _compact(self) -> None:
+        index: Dict[str, Dict[str, _ThresholdIndex]] = {}
+        for rule in self.rules.values():
+            index.setdefault(rule.symbol, {}).setdefault(rule.op, _ThresholdIndex()).add(
+                rule.threshold, rule.rule_id)
+        for by_op in index.values():
+            for threshold_index in by_op.values():
+                threshold_index.ensure_sorted()
+        self._index = index
+        self._disarmed = {symbol: {rule_id for rule_id in rule_ids if rule_id in self.rules}
+                          for symbol, rule_ids in self._disarmed.items()}
+        self._last_fired = {state: t for state, t in self._last_fired.items() if state[0] in self.rules}
+        self._stale = 0
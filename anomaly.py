@@ -0,0 +1,184 @@
+"""
+Module for detecting abnormal spikes in the leverage indicator
+
+Each symbol keeps an exponentially weighted mean and variance of its
+log ratio, with a time constant of the baseline window (7 days by
+default), in flat arrays indexed by a per-symbol slot. A snapshot updates
+every symbol it contains in O(1) each, so nothing is recomputed from
+history, and the arrays are small enough to save after every snapshot
+and reload on restart.
+
+Ratios span many orders of magnitude, so the statistics are kept on
+log1p(ratio): "5σ above baseline" then means a jump that is large
+relative to how much that symbol usually moves, not relative to its size.
+"""
+
+import logging
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+class AnomalyDetector:
+    """
+    Online per-symbol EWMA baseline with z-score spike detection.
+
+    A value is flagged when it is at least `threshold_sigma` standard
+    deviations above the symbol's baseline, once the symbol has at least
+    `min_samples` observations. The standard deviation is floored at
+    `min_std` (in log space) so a symbol that has been flat doesn't flag
+    every small move.
+    """
+
+    def __init__(self, baseline_seconds: float = 7 * 24 * 3600, threshold_sigma: float = 5.0,
+                 min_samples: int = 30, min_std: float = 0.05, state_path: Optional[str] = None):
+        self.baseline_seconds = baseline_seconds
+        self.threshold_sigma = threshold_sigma
+        self.min_samples = min_samples
+        self.min_std = min_std
+        self.state_path = state_path
+        self._slots: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._mean = np.zeros(64)
+        self._var = np.zeros(64)
+        self._count = np.zeros(64, dtype=np.int64)
+        self._last_seen = np.zeros(64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of symbols with a baseline."""
+        return len(self._symbols)
+
+    def _slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = len(self._symbols)
+            if slot == len(self._mean):
+                grow = len(self._mean)
+                self._mean = np.concatenate([self._mean, np.zeros(grow)])
+                self._var = np.concatenate([self._var, np.zeros(grow)])
+                self._count = np.concatenate([self._count, np.zeros(grow, dtype=np.int64)])
+                self._last_seen = np.concatenate([self._last_seen, np.zeros(grow)])
+            self._slots[symbol] = slot
+            self._symbols.append(symbol)
+        return slot
+
+    def observe(self, data: List[Dict], timestamp: Optional[datetime] = None) -> List[Dict]:
+        """
+        Update the baselines with a snapshot and return its anomalies.
+
+        Args:
+            data: Rows with 'symbol' and 'ratio'
+            timestamp: When the snapshot was taken (default: now, UTC)
+
+        Returns:
+            One dict per anomalous symbol with symbol, ratio, baseline
+            (the baseline ratio), zscore and detected_at
+        """
+        timestamp = timestamp or datetime.utcnow()
+        now = (timestamp - _EPOCH).total_seconds()
+        rows = {row['symbol']: float(row.get('ratio', 0) or 0) for row in data}
+        if not rows:
+            return []
+
+        with self._lock:
+            slots = np.fromiter((self._slot(symbol) for symbol in rows), dtype=np.int64, count=len(rows))
+            values = np.log1p(np.maximum(np.fromiter(rows.values(), dtype=float, count=len(rows)), 0))
+
+            mean = self._mean[slots]
+            var = self._var[slots]
+            count = self._count[slots]
+
+            # Score against the baseline before this value joins it
+            std = np.maximum(np.sqrt(var), self.min_std)
+            zscore = (values - mean) / std
+            flagged = (count >= self.min_samples) & (zscore >= self.threshold_sigma)
+
+            # Time-weighted EWMA: a gap between snapshots counts for its
+            # length. Until a symbol has a window's worth of samples, the
+            # plain running average (1/n) is used instead, so early
+            # samples don't leave the variance near zero.
+            elapsed = np.maximum(now - self._last_seen[slots], 0)
+            alpha = np.maximum(-np.expm1(-elapsed / self.baseline_seconds), 1.0 / (count + 1))
+            diff = values - mean
+            increment = alpha * diff
+            self._mean[slots] = mean + increment
+            self._var[slots] = (1 - alpha) * (var + diff * increment)
+            self._count[slots] = count + 1
+            self._last_seen[slots] = now
+
+            anomalies = [{
+                'symbol': self._symbols[slots[i]],
+                'ratio': rows[self._symbols[slots[i]]],
+                'baseline': float(np.expm1(mean[i])),
+                'zscore': round(float(zscore[i]), 2),
+                'detected_at': timestamp
+            } for i in np.flatnonzero(flagged)]
+
+        if anomalies:
+            logger.info(f"Detected {len(anomalies)} anomalies: {', '.join(a['symbol'] for a in anomalies)}")
+        return anomalies
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Write the baselines to `path` (default: state_path) atomically."""
+        path = path or self.state_path
+        if not path:
+            return
+        with self._lock:
+            size = len(self._symbols)
+            state = {
+                'symbols': np.array(self._symbols, dtype=str),
+                'mean': self._mean[:size].copy(),
+                'var': self._var[:size].copy(),
+                'count': self._count[:size].copy(),
+                'last_seen': self._last_seen[:size].copy(),
+                'baseline_seconds': np.array(self.baseline_seconds),
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **state)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """
+        Restore baselines saved by save(). Returns False, keeping an empty
+        state, if there is no usable state file.
+        """
+        path = path or self.state_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as state:
+                symbols = [str(symbol) for symbol in state['symbols']]
+                mean, var = state['mean'], state['var']
+                count, last_seen = state['count'], state['last_seen']
+                saved_baseline = float(state['baseline_seconds'])
+        except Exception as e:
+            logger.error(f"Could not load anomaly detector state from {path}: {e}")
+            return False
+        if not math.isclose(saved_baseline, self.baseline_seconds):
+            logger.warning(f"Anomaly state in {path} was built with a different baseline window, starting over")
+            return False
+
+        with self._lock:
+            capacity = max(64, 1 << max(len(symbols) - 1, 0).bit_length())
+            self._symbols = symbols
+            self._slots = {symbol: slot for slot, symbol in enumerate(symbols)}
+            self._mean = np.zeros(capacity)
+            self._var = np.zeros(capacity)
+            self._count = np.zeros(capacity, dtype=np.int64)
+            self._last_seen = np.zeros(capacity)
+            self._mean[:len(symbols)] = mean
+            self._var[:len(symbols)] = var
+            self._count[:len(symbols)] = count
+            self._last_seen[:len(symbols)] = last_seen
+        logger.info(f"Loaded anomaly baselines for {len(symbols)} symbols from {path}")
+        return True
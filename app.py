@@ -1,17 +1,78 @@
 import os
+import io
+import atexit
+import click
+import contextlib
+import csv
+import heapq
+import itertools
 import json
+import time
+import zlib
+import threading
 import requests
 import logging
 import ccxt
 import pandas as pd
-from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+from flask import Flask, render_template, jsonify, request, make_response, stream_template, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 import plotly.express as px
 import plotly.utils as pu
 
+from apscheduler.schedulers.background import BackgroundScheduler
+
+import anomaly
+import archive
+import backfill
+import binance_api
+import cadence
+import charts
+import exchange_data
+import quota
+import ranking
+import snapshots
+from config import (
+    SNAPSHOT_TTL_SECONDS,
+    RAW_RETENTION_DAYS,
+    HOURLY_RETENTION_DAYS,
+    RETENTION_BATCH_SIZE,
+    MAINTENANCE_INTERVAL_MINUTES,
+    MAINTENANCE_JOBS_ENABLED,
+    ARCHIVE_DIR,
+    WRITE_BEHIND_QUEUE_SIZE,
+    WRITE_BEHIND_BATCH_SIZE,
+    CHART_WORKERS,
+    CHART_TASKS_PER_CHILD,
+    CHART_CACHE_SIZE,
+    REFRESH_MIN_SECONDS,
+    REFRESH_MAX_SECONDS,
+    REFRESH_HIGH_CHANGE,
+    REFRESH_LOW_CHANGE,
+    STREAM_MAX_CLIENTS,
+    STREAM_MAX_THREADED_CLIENTS,
+    STREAM_RETRY_SECONDS,
+    REAL_DATA_MODE,
+    REAL_DATA_EXCHANGES,
+    EXCHANGE_TIMEOUT_SECONDS,
+    EXCHANGE_DATA_TTL_SECONDS,
+    RANKING_SIZE,
+    RANKING_MIN_RATIO,
+    BINANCE_MARGIN_TIMEOUT_SECONDS,
+    ANOMALY_BASELINE_DAYS,
+    ANOMALY_THRESHOLD_SIGMA,
+    ANOMALY_MIN_SAMPLES,
+    ANOMALY_STATE_FILE,
+)
+from downsampling import lttb
+from page_cache import RenderedPageCache
+from singleflight import SingleFlight
+from stream_hub import SnapshotStreamHub
+from write_behind import WriteBehindQueue
+
 # Configure logging
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -49,6 +110,11 @@ class CryptoData(db.Model):
     repay_amount = db.Column(db.Float, nullable=False)
     ratio = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Serves per-symbol time-series reads
+    __table_args__ = (
+        db.Index('ix_crypto_data_symbol_timestamp', 'symbol', 'timestamp'),
+    )
     
     def to_dict(self):
         return {
@@ -59,29 +125,339 @@ class CryptoData(db.Model):
             'timestamp': self.timestamp.isoformat()
         }
 
+class CryptoLatest(db.Model):
+    """Latest values per symbol, upserted on every ingest"""
+    __tablename__ = 'crypto_latest'
+    symbol = db.Column(db.String(20), primary_key=True)
+    borrow_amount = db.Column(db.Float, nullable=False)
+    repay_amount = db.Column(db.Float, nullable=False)
+    ratio = db.Column(db.Float, nullable=False, index=True)
+    timestamp = db.Column(db.DateTime, nullable=False)  # Last time the values were seen
+
+class SnapshotLog(db.Model):
+    """One row per distinct snapshot written to crypto_data"""
+    __tablename__ = 'snapshot_log'
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(40), nullable=False)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)  # Heartbeat: still valid at this time
+    rows = db.Column(db.Integer, nullable=False)
+
+class BinanceMarginData(db.Model):
+    """Binance margin borrow/repay totals, stored whenever they change"""
+    __tablename__ = 'binance_margin_data'
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    borrow_amount = db.Column(db.Float, nullable=False)
+    repay_amount = db.Column(db.Float, nullable=False)
+    ratio = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_binance_margin_data_symbol_timestamp', 'symbol', 'timestamp'),
+    )
+
+class Anomaly(db.Model):
+    """A ratio flagged as far above its symbol's baseline; also the bot's notification queue"""
+    __tablename__ = 'anomalies'
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    ratio = db.Column(db.Float, nullable=False)
+    baseline = db.Column(db.Float, nullable=False)  # Baseline ratio when detected
+    zscore = db.Column(db.Float, nullable=False)
+    detected_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'ratio': self.ratio,
+            'baseline': self.baseline,
+            'zscore': self.zscore,
+            'detected_at': self.detected_at.isoformat()
+        }
+
+class RatioAggregate:
+    """Columns shared by the hourly and daily rollups of CryptoData"""
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the hour/day
+    ratio_min = db.Column(db.Float, nullable=False)
+    ratio_max = db.Column(db.Float, nullable=False)
+    ratio_avg = db.Column(db.Float, nullable=False)
+    ratio_last = db.Column(db.Float, nullable=False)
+    borrow_amount = db.Column(db.Float, nullable=False)  # Last value in the bucket
+    repay_amount = db.Column(db.Float, nullable=False)  # Last value in the bucket
+    samples = db.Column(db.Integer, nullable=False)
+
+class CryptoDataHourly(RatioAggregate, db.Model):
+    __tablename__ = 'crypto_data_hourly'
+    __table_args__ = (
+        db.UniqueConstraint('symbol', 'bucket', name='uq_crypto_data_hourly_symbol_bucket'),
+    )
+
+class CryptoDataDaily(RatioAggregate, db.Model):
+    __tablename__ = 'crypto_data_daily'
+    __table_args__ = (
+        db.UniqueConstraint('symbol', 'bucket', name='uq_crypto_data_daily_symbol_bucket'),
+    )
+
+# Concurrent callers of the same upstream fetch share one request
+upstream_fetches = SingleFlight()
+
+# CoinGecko key budget, shared with the bots
+coingecko_quota = quota.coingecko_budget()
+
+# CoinGecko ranking, updated in place as coins change between fetches
+coingecko_ranking = ranking.TopKRanking(k=RANKING_SIZE, threshold=RANKING_MIN_RATIO)
+
+# Runs the Binance margin source alongside the ranking sources
+source_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='source')
+
 # Function to fetch crypto data from different exchanges
-def fetch_crypto_borrow_data():
+def fetch_crypto_borrow_data(priority=quota.ON_DEMAND):
     """
-    Fetch cryptocurrency leverage indicator data from exchanges.
+    Fetch cryptocurrency leverage indicator data from exchanges, with each
+    row's Binance margin borrow/repay totals, which are fetched concurrently.
     Returns the top 20 cryptocurrencies by leverage indicators.
     """
+    margin_future = source_executor.submit(upstream_fetches.do, 'binance-margin', fetch_binance_margin_data)
+    data = fetch_ranking_data(priority)
+    try:
+        margin_rows = margin_future.result(timeout=BINANCE_MARGIN_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        # A hung Binance call must not hold up the snapshot; the fetch
+        # keeps running and fills the cache file for later refreshes
+        logger.warning(f"Binance margin data took over {BINANCE_MARGIN_TIMEOUT_SECONDS}s, using cached rows")
+        margin_rows = load_binance_cache()
+    return add_margin_data(data, margin_rows)
+
+def fetch_ranking_data(priority=quota.ON_DEMAND):
+    """
+    Fetch the leverage indicator ranking from CoinGecko, falling back to
+    CCXT and then to cached data.
+    """
     try:
         # First try to get data from CoinGecko
-        return fetch_coingecko_market_data()
+        return upstream_fetches.do('coingecko', fetch_coingecko_market_data, priority)
+    except quota.QuotaExhausted as e:
+        logger.warning(f"{e}, serving cached data")
+        return get_cached_or_sample_data()
     except Exception as e:
         logger.error(f"Error fetching from CoinGecko: {e}")
         
         # If CoinGecko fails, try another source
         try:
-            return fetch_alternative_source_data()
+            return upstream_fetches.do('ccxt', fetch_alternative_source_data)
         except Exception as e:
             logger.error(f"Error fetching from alternative source: {e}")
             
             # If all fails, get from cache or sample
             return get_cached_or_sample_data()
 
-def fetch_coingecko_market_data():
+def fetch_binance_margin_data():
+    """Fetch Binance margin rows, falling back to the cache file"""
+    try:
+        rows = binance_api.fetch_margin_rows()
+    except Exception as e:
+        logger.error(f"Error fetching from Binance: {e}")
+        return load_binance_cache()
+
+    # Hand off to the cache file and database in the background
+    margin_persistence_queue.submit((datetime.utcnow(), rows))
+    return rows
+
+def add_margin_data(data, margin_rows):
+    """Attach Binance's margin borrow/repay totals to each row that has them"""
+    margin = {row['symbol']: row for row in margin_rows}
+    enriched = []
+    for item in data:
+        row = margin.get(item['symbol'])
+        if row is not None:
+            item = dict(item,
+                        margin_borrowed=row['borrow_amount'],
+                        margin_repaid=row['repay_amount'],
+                        margin_ratio=row['ratio'])
+        enriched.append(item)
+    return enriched
+
+def get_current_snapshot(priority=quota.ON_DEMAND):
+    """
+    Return the published snapshot, refreshing it from the exchanges
+    once it is no longer fresh.
+    """
+    snapshot = snapshots.get_snapshot()
+    if snapshots.is_fresh(snapshot):
+        return snapshot
+    return upstream_fetches.do('snapshot', refresh_snapshot, priority)
+
+def refresh_snapshot(priority=quota.ON_DEMAND):
+    """Fetch and publish a new snapshot unless another caller just did"""
+    snapshot = snapshots.get_snapshot()
+    if snapshots.is_fresh(snapshot):
+        return snapshot
+    data = fetch_crypto_borrow_data(priority)
+    if REAL_DATA_MODE:
+        data = add_exchange_data(data)
+    return snapshots.publish_snapshot(data, SNAPSHOT_TTL_SECONDS)
+
+# Merged funding/open interest/borrow data from the exchanges (real-data mode)
+_exchange_view = {'expires_at': 0.0, 'data': []}
+
+def get_exchange_view():
+    """Return the merged per-symbol exchange data, refreshing it once it expires"""
+    if time.time() < _exchange_view['expires_at']:
+        return _exchange_view['data']
+    return upstream_fetches.do('exchange-data', refresh_exchange_view)
+
+def refresh_exchange_view():
+    """Fetch all exchanges in parallel unless another caller just did"""
+    if time.time() < _exchange_view['expires_at']:
+        return _exchange_view['data']
+    data = exchange_data.fetch_exchange_data(REAL_DATA_EXCHANGES, EXCHANGE_TIMEOUT_SECONDS)
+    _exchange_view['data'] = data
+    _exchange_view['expires_at'] = time.time() + EXCHANGE_DATA_TTL_SECONDS
+    return data
+
+def add_exchange_data(data):
+    """Attach funding rate, open interest and borrow rate to each row"""
+    try:
+        view = {row['symbol']: row for row in get_exchange_view()}
+    except Exception as e:
+        logger.error(f"Error fetching exchange data: {e}")
+        return data
+
+    enriched = []
+    for item in data:
+        row = view.get(item['symbol'])
+        if row is not None:
+            item = dict(item,
+                        funding_rate=row['funding_rate'],
+                        open_interest=row['open_interest'],
+                        borrow_rate=row['borrow_rate'],
+                        exchanges=row['exchanges'])
+        enriched.append(item)
+    return enriched
+
+# Live snapshot updates for the dashboard
+def stream_client_limit():
+    """
+    How many stream connections this process can hold. Under gunicorn's
+    gevent worker a connection is a greenlet; otherwise it pins one of a
+    few worker threads, so the limit stays well below the thread count.
+    """
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return STREAM_MAX_CLIENTS
+    except ImportError:
+        pass
+    return min(STREAM_MAX_CLIENTS, STREAM_MAX_THREADED_CLIENTS)
+
+snapshot_stream = SnapshotStreamHub(retry_seconds=STREAM_RETRY_SECONDS)
+_refresher_lock = threading.Lock()
+# Stop event of the running refresher, None when it isn't running
+_refresher = {"stop": None}
+
+def stream_snapshot(snapshot):
+    """Push a newly published snapshot to connected stream clients"""
+    snapshot_stream.publish(snapshot['id'], {
+        'snapshot_id': snapshot['id'],
+        'timestamp': format_snapshot_timestamp(snapshot),
+        'data': snapshot['data']
+    })
+
+snapshots.add_listener(stream_snapshot)
+
+# Per-day history charts, keyed by content so each day is built once
+day_chart_cache = charts.DayChartCache(CHART_CACHE_SIZE)
+
+# Rendered homepage per snapshot, dropped whenever a new snapshot is published
+index_page_cache = RenderedPageCache()
+snapshots.add_listener(index_page_cache.clear)
+
+# Per-symbol ratio baselines, restored from disk so a restart keeps them
+anomaly_detector = anomaly.AnomalyDetector(
+    baseline_seconds=ANOMALY_BASELINE_DAYS * 24 * 3600,
+    threshold_sigma=ANOMALY_THRESHOLD_SIGMA,
+    min_samples=ANOMALY_MIN_SAMPLES,
+    state_path=ANOMALY_STATE_FILE
+)
+anomaly_detector.load()
+
+def persist_anomalies(batch):
+    """Write-behind handler: record flagged anomalies and save the baselines"""
+    rows = [row for anomalies in batch for row in anomalies]
+    if rows:
+        with app.app_context():
+            try:
+                db.session.execute(db.insert(Anomaly), rows)
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Could not save anomalies to database: {e}")
+                db.session.rollback()
+    try:
+        anomaly_detector.save()
+    except Exception as e:
+        logger.error(f"Could not save anomaly detector state: {e}")
+
+anomaly_queue = WriteBehindQueue(persist_anomalies,
+                                 maxsize=WRITE_BEHIND_QUEUE_SIZE,
+                                 batch_size=WRITE_BEHIND_BATCH_SIZE,
+                                 name="anomalies")
+atexit.register(anomaly_queue.stop)
+
+def detect_anomalies(snapshot):
+    """Update the baselines with a newly published snapshot and queue its anomalies"""
+    anomaly_queue.submit(anomaly_detector.observe(snapshot['data'], snapshot['timestamp']))
+
+snapshots.add_listener(detect_anomalies)
+
+# Background refreshes speed up when the market moves and back off when it doesn't
+refresh_cadence = cadence.AdaptiveCadence(
+    min_seconds=max(SNAPSHOT_TTL_SECONDS, REFRESH_MIN_SECONDS),
+    max_seconds=REFRESH_MAX_SECONDS,
+    high_change=REFRESH_HIGH_CHANGE,
+    low_change=REFRESH_LOW_CHANGE,
+    quota=coingecko_quota,
+    name="snapshot"
+)
+
+def refresh_snapshots_forever(stop):
+    """Keep the snapshot fresh so stream clients get updates without page hits, until `stop` is set"""
+    while not stop.is_set():
+        try:
+            snapshot = get_current_snapshot(quota.SCHEDULED)
+            interval = refresh_cadence.observe(snapshot['data'])
+            stop.wait(max(1, snapshots.remaining_freshness(snapshot), interval))
+        except Exception as e:
+            logger.error(f"Error refreshing snapshot: {e}")
+            stop.wait(SNAPSHOT_TTL_SECONDS)
+    logger.info("Stopped background snapshot refresher")
+
+def start_snapshot_refresher():
+    """Start the background refresher once, when the first stream client connects"""
+    with _refresher_lock:
+        if _refresher["stop"] is not None:
+            return
+        stop = _refresher["stop"] = threading.Event()
+    threading.Thread(target=refresh_snapshots_forever, args=(stop,), name="snapshot-refresher", daemon=True).start()
+    logger.info("Started background snapshot refresher")
+
+def stop_snapshot_refresher():
+    """Stop the background refresher; the next stream client starts it again"""
+    with _refresher_lock:
+        stop, _refresher["stop"] = _refresher["stop"], None
+    if stop is not None:
+        stop.set()
+
+atexit.register(stop_snapshot_refresher)
+
+def fetch_coingecko_market_data(priority=quota.ON_DEMAND):
     """Fetch market data from CoinGecko API to derive a leverage indicator"""
+    if not coingecko_quota.acquire(priority):
+        raise quota.QuotaExhausted(f"CoinGecko quota too low for a {priority} call")
+
     url = "https://api.coingecko.com/api/v3/coins/markets"
     params = {
         "vs_currency": "usd",
@@ -140,18 +516,18 @@ def fetch_coingecko_market_data():
                 'ratio': leverage_indicator  # Our derived leverage indicator
             })
         
-        # Filter for high leverage indicators (> 10) and sort by the indicator (descending)
-        result = [item for item in result if item['ratio'] > 10]
-        result = sorted(result, key=lambda x: x['ratio'], reverse=True)[:20]
-        
-        # Save to cache
-        save_to_cache(result)
+        # Keep the top 20 high leverage indicators (> 10); only coins whose
+        # values changed since the last fetch touch the ranking
+        coingecko_ranking.replace_all(result)
+        result = coingecko_ranking.top()
         
-        # Save to database
-        save_to_database(result)
+        # Hand off to the cache file and database in the background
+        persist_snapshot(result)
         
         return result
     else:
+        if response.status_code == 429:
+            coingecko_quota.penalize(quota.retry_after_seconds(response.headers.get('Retry-After')))
         logger.error(f"CoinGecko API returned status code {response.status_code}")
         raise Exception(f"Failed to fetch data from CoinGecko: {response.status_code}")
 
@@ -178,49 +554,29 @@ def fetch_alternative_source_data():
             
             # For each exchange, we'll estimate borrow/repay by using 
             # 24h volume and price changes as a proxy
-            symbols = list(markets.keys())[:30]  # Limit to 30 symbols for speed
-            
-            for symbol in symbols:
-                try:
-                    # Get OHLCV data (Open, High, Low, Close, Volume)
-                    ohlcv = exchange.fetch_ohlcv(symbol, '1d', limit=2)
+            for symbol, volume, price_change in fetch_volume_changes(exchange, markets):
+                # Crude proxy: positive price change = more borrowing than repaying
+                if price_change > 0:
+                    # More buying than selling - proxy for borrowing
+                    borrow_amount = volume * 0.6  # Assume 60% of volume is borrowed
+                    repay_amount = volume * 0.4   # Assume 40% is repaid
+                else:
+                    # More selling than buying
+                    borrow_amount = volume * 0.4
+                    repay_amount = volume * 0.6
                     
-                    if len(ohlcv) >= 2:
-                        # Use yesterday's data
-                        yesterday = ohlcv[0]
-                        
-                        # Calculate metrics
-                        volume = yesterday[5]  # Volume
-                        price_change = yesterday[4] - yesterday[1]  # Close - Open
-                        
-                        # Crude proxy: positive price change = more borrowing than repaying
-                        if price_change > 0:
-                            # More buying than selling - proxy for borrowing
-                            borrow_amount = volume * 0.6  # Assume 60% of volume is borrowed
-                            repay_amount = volume * 0.4   # Assume 40% is repaid
-                        else:
-                            # More selling than buying
-                            borrow_amount = volume * 0.4
-                            repay_amount = volume * 0.6
-                            
-                        ratio = round(borrow_amount / repay_amount, 2)
-                        
-                        # Extract base symbol (BTC from BTC/USDT)
-                        base_symbol = symbol.split('/')[0]
-                        
-                        all_data.append({
-                            'symbol': base_symbol,
-                            'borrow_amount': borrow_amount,
-                            'borrow_formatted': format_large_number(borrow_amount),
-                            'repay_amount': repay_amount,
-                            'repay_formatted': format_large_number(repay_amount),
-                            'ratio': ratio
-                        })
-                        
-                        success = True
-                except Exception as e:
-                    logger.warning(f"Error processing {symbol} on {exchange_id}: {e}")
-                    continue
+                ratio = round(borrow_amount / repay_amount, 2)
+                
+                all_data.append({
+                    'symbol': markets[symbol]['base'],
+                    'borrow_amount': borrow_amount,
+                    'borrow_formatted': format_large_number(borrow_amount),
+                    'repay_amount': repay_amount,
+                    'repay_formatted': format_large_number(repay_amount),
+                    'ratio': ratio
+                })
+                
+                success = True
                 
         except Exception as e:
             logger.error(f"Error with exchange {exchange_id}: {e}")
@@ -245,21 +601,69 @@ def fetch_alternative_source_data():
     grouped['repay_formatted'] = grouped['repay_amount'].apply(format_large_number)
     
     # Filter for ratios > 10 and sort by ratio (descending)
-    filtered = grouped[grouped['ratio'] > 10]
+    filtered = grouped[grouped['ratio'] > RANKING_MIN_RATIO]
     # If we have enough data with ratio > 10, use that, otherwise use top 20
     if len(filtered) > 0:
-        result = filtered.sort_values('ratio', ascending=False).head(20).to_dict('records')
+        result = filtered.nlargest(RANKING_SIZE, 'ratio').to_dict('records')
     else:
-        result = grouped.sort_values('ratio', ascending=False).head(20).to_dict('records')
-    
-    # Save to cache
-    save_to_cache(result)
+        result = grouped.nlargest(RANKING_SIZE, 'ratio').to_dict('records')
     
-    # Save to database
-    save_to_database(result)
+    # Hand off to the cache file and database in the background
+    persist_snapshot(result)
     
     return result
 
+def fetch_volume_changes(exchange, markets, quote='USDT', ohlcv_limit=30):
+    """
+    Yield (symbol, volume, close - open) over the last 24h for every active
+    spot market quoted in `quote` on an exchange.
+
+    All markets come from one bulk fetch_tickers() request. Per-symbol
+    OHLCV requests are only made for markets whose ticker lacks a volume
+    or open price (and no 24h change to derive it from), or when the
+    exchange has no bulk ticker endpoint at all; either way, at most
+    `ohlcv_limit` of them are made per call.
+    """
+    symbols = [symbol for symbol, market in markets.items()
+               if market.get('spot') and market.get('active') is not False and market.get('quote') == quote]
+
+    tickers = {}
+    if exchange.has.get('fetchTickers'):
+        tickers = exchange.fetch_tickers()
+        logger.info(f"Fetched {len(tickers)} tickers from {exchange.id} in one request")
+    else:
+        symbols = symbols[:ohlcv_limit]
+
+    ohlcv_requests = 0
+    for symbol in symbols:
+        ticker = tickers.get(symbol)
+        if tickers and ticker is None:
+            # Not trading right now
+            continue
+        volume = ticker.get('baseVolume') if ticker else None
+        open_price = ticker.get('open') if ticker else None
+        close_price = (ticker.get('close') or ticker.get('last')) if ticker else None
+        if open_price is None and close_price is not None and ticker.get('change') is not None:
+            open_price = close_price - ticker['change']
+        if volume is None or open_price is None or close_price is None:
+            if ohlcv_requests >= ohlcv_limit:
+                if ohlcv_requests == ohlcv_limit:
+                    logger.warning(f"Incomplete tickers on {exchange.id}, skipping markets past {ohlcv_limit} OHLCV requests")
+                    ohlcv_requests += 1
+                continue
+            ohlcv_requests += 1
+            try:
+                # Get OHLCV data (Open, High, Low, Close, Volume) and use yesterday's candle
+                ohlcv = exchange.fetch_ohlcv(symbol, '1d', limit=2)
+                if len(ohlcv) < 2:
+                    continue
+                open_price, close_price, volume = ohlcv[0][1], ohlcv[0][4], ohlcv[0][5]
+            except Exception as e:
+                logger.warning(f"Error processing {symbol} on {exchange.id}: {e}")
+                continue
+        if volume:
+            yield symbol, volume, close_price - open_price
+
 def get_cached_or_sample_data():
     """Get data from cache or use sample data as last resort"""
     try:
@@ -277,31 +681,9 @@ def get_cached_or_sample_data():
                     
         # Check database for recent data
         with app.app_context():
-            one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-            recent_data = CryptoData.query.filter(CryptoData.timestamp > one_hour_ago).all()
-            
-            if recent_data:
+            result = get_latest_ranking()
+            if result:
                 logger.info("Using database crypto data")
-                # Process into the format we need
-                symbols = set(item.symbol for item in recent_data)
-                result = []
-                
-                for symbol in symbols:
-                    symbol_data = [item for item in recent_data if item.symbol == symbol]
-                    if symbol_data:
-                        latest = max(symbol_data, key=lambda x: x.timestamp)
-                        result.append({
-                            'symbol': latest.symbol,
-                            'borrow_amount': latest.borrow_amount,
-                            'borrow_formatted': format_large_number(latest.borrow_amount),
-                            'repay_amount': latest.repay_amount,
-                            'repay_formatted': format_large_number(latest.repay_amount),
-                            'ratio': latest.ratio
-                        })
-                
-                # Filter for ratio > 10 and sort by ratio (descending)
-                result = [item for item in result if item['ratio'] > 10]
-                result = sorted(result, key=lambda x: x['ratio'], reverse=True)[:20]
                 return result
     
     except Exception as e:
@@ -311,11 +693,11 @@ def get_cached_or_sample_data():
     logger.warning("Using sample crypto data - Not real data")
     return get_sample_data()
 
-def save_to_cache(data):
+def save_to_cache(data, timestamp=None):
     """Save data to a cache file"""
     try:
         cache_data = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': (timestamp or datetime.utcnow()).isoformat(),
             'data': data
         }
         
@@ -326,25 +708,454 @@ def save_to_cache(data):
     except Exception as e:
         logger.error(f"Could not save to cache: {e}")
 
-def save_to_database(data):
-    """Save crypto data to database"""
-    try:
-        with app.app_context():
-            for item in data:
-                crypto_data = CryptoData(
-                    symbol=item['symbol'],
-                    borrow_amount=item['borrow_amount'],
-                    repay_amount=item['repay_amount'],
-                    ratio=item['ratio']
-                )
-                db.session.add(crypto_data)
+def save_to_database(batch):
+    """
+    Save a batch of (timestamp, data) snapshots to the database in one transaction.
+    A snapshot identical to the previous one is not inserted again; the
+    previous snapshot's last_seen heartbeat is moved forward instead.
+    """
+    with app.app_context():
+        try:
+            previous = SnapshotLog.query.order_by(SnapshotLog.id.desc()).first()
+            skipped = 0
+
+            for timestamp, data in batch:
+                digest = snapshots.content_hash(data)
+                if previous is not None and previous.content_hash == digest:
+                    previous.last_seen = timestamp
+                    skipped += 1
+                    continue
+
+                previous = SnapshotLog(content_hash=digest, first_seen=timestamp,
+                                       last_seen=timestamp, rows=len(data))
+                db.session.add(previous)
+                for item in data:
+                    crypto_data = CryptoData(
+                        symbol=item['symbol'],
+                        borrow_amount=item['borrow_amount'],
+                        repay_amount=item['repay_amount'],
+                        ratio=item['ratio'],
+                        timestamp=timestamp
+                    )
+                    db.session.add(crypto_data)
+
+            # Unchanged snapshots still refresh crypto_latest's timestamps
+            timestamp, data = batch[-1]
+            upsert_latest(timestamp, data)
             
             db.session.commit()
-            logger.info("Saved crypto data to database")
+            logger.info(f"Saved {len(batch) - skipped} crypto data snapshots to database, "
+                        f"{skipped} unchanged")
+        except Exception as e:
+            logger.error(f"Could not save to database: {e}")
+            # Rollback in case of error
+            db.session.rollback()
+
+def upsert_latest(timestamp, data):
+    """Upsert one snapshot's rows into crypto_latest, one row per symbol"""
+    rows = {}
+    for item in data:
+        # An upsert may touch each symbol only once per statement
+        rows.setdefault(item['symbol'], {
+            'symbol': item['symbol'],
+            'borrow_amount': item['borrow_amount'],
+            'repay_amount': item['repay_amount'],
+            'ratio': item['ratio'],
+            'timestamp': timestamp
+        })
+    if not rows:
+        return
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows.values():
+            db.session.merge(CryptoLatest(**row))
+        return
+
+    stmt = insert(CryptoLatest).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CryptoLatest.symbol],
+        set_={column: stmt.excluded[column]
+              for column in ('borrow_amount', 'repay_amount', 'ratio', 'timestamp')}
+    )
+    db.session.execute(stmt)
+
+def get_latest_ranking(limit=20, min_ratio=10, max_age=timedelta(hours=1)):
+    """
+    Return the current ranking straight from crypto_latest: symbols seen
+    within `max_age` with a ratio above `min_ratio`, highest first.
+    """
+    cutoff = datetime.utcnow() - max_age
+    latest = (CryptoLatest.query
+              .filter(CryptoLatest.timestamp > cutoff, CryptoLatest.ratio > min_ratio)
+              .order_by(CryptoLatest.ratio.desc())
+              .limit(limit)
+              .all())
+    return [{
+        'symbol': row.symbol,
+        'borrow_amount': row.borrow_amount,
+        'borrow_formatted': format_large_number(row.borrow_amount),
+        'repay_amount': row.repay_amount,
+        'repay_formatted': format_large_number(row.repay_amount),
+        'ratio': row.ratio
+    } for row in latest]
+
+def persist_batch(batch):
+    """Write-behind handler: only the newest snapshot matters for the cache file"""
+    timestamp, data = batch[-1]
+    save_to_cache(data, timestamp)
+    save_to_database(batch)
+
+# Fetches return as soon as data is computed; writes happen on this worker
+persistence_queue = WriteBehindQueue(persist_batch,
+                                     maxsize=WRITE_BEHIND_QUEUE_SIZE,
+                                     batch_size=WRITE_BEHIND_BATCH_SIZE,
+                                     name="persistence")
+atexit.register(persistence_queue.stop)
+
+BINANCE_CACHE_FILE = 'cached_binance_margin.json'
+_last_margin_hash = None
+
+def load_binance_cache():
+    """Return the cached Binance margin rows if they are less than an hour old"""
+    try:
+        if os.path.exists(BINANCE_CACHE_FILE):
+            with open(BINANCE_CACHE_FILE, 'r') as f:
+                cached = json.load(f)
+            if datetime.utcnow() - datetime.fromisoformat(cached['timestamp']) < timedelta(hours=1):
+                logger.info("Using cached Binance margin data")
+                return cached['data']
     except Exception as e:
-        logger.error(f"Could not save to database: {e}")
-        # Rollback in case of error
+        logger.error(f"Error loading cached Binance margin data: {e}")
+    return []
+
+def persist_margin_batch(batch):
+    """
+    Write-behind handler for Binance margin rows: the newest fetch goes to
+    the cache file, and each fetch that differs from the last stored one
+    is inserted into binance_margin_data.
+    """
+    global _last_margin_hash
+    timestamp, rows = batch[-1]
+    try:
+        with open(BINANCE_CACHE_FILE, 'w') as f:
+            json.dump({'timestamp': timestamp.isoformat(), 'data': rows}, f)
+    except Exception as e:
+        logger.error(f"Could not save Binance margin data to cache: {e}")
+
+    with app.app_context():
+        try:
+            last_hash = _last_margin_hash
+            for timestamp, rows in batch:
+                digest = snapshots.content_hash(rows)
+                if digest == last_hash:
+                    continue
+                db.session.execute(db.insert(BinanceMarginData), [
+                    dict(row, timestamp=timestamp) for row in rows
+                ])
+                last_hash = digest
+            db.session.commit()
+            _last_margin_hash = last_hash
+        except Exception as e:
+            logger.error(f"Could not save Binance margin data to database: {e}")
+            db.session.rollback()
+
+margin_persistence_queue = WriteBehindQueue(persist_margin_batch,
+                                            maxsize=WRITE_BEHIND_QUEUE_SIZE,
+                                            batch_size=WRITE_BEHIND_BATCH_SIZE,
+                                            name="margin-persistence")
+atexit.register(margin_persistence_queue.stop)
+
+def persist_snapshot(data):
+    """Queue freshly fetched data for the cache file and database"""
+    persistence_queue.submit((datetime.utcnow(), data))
+
+def _floor_hour(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def _floor_day(timestamp):
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _fill_hours(first_seen, last_seen, start, end):
+    """Yield the hour starts after first_seen, up to last_seen, within [start, end]"""
+    hour = _floor_hour(max(first_seen, start - timedelta(microseconds=1))) + timedelta(hours=1)
+    while hour <= min(last_seen, end):
+        yield hour
+        hour += timedelta(hours=1)
+
+def heartbeat_rows(start, end, symbol=None):
+    """
+    Fill forward snapshots that were seen again unchanged.
+
+    An unchanged snapshot is not stored again; only the last_seen heartbeat
+    of its SnapshotLog entry moves. Readers repeat its rows at the start of
+    every hour after first_seen up to last_seen, so a stable period reads
+    as one sample per hour instead of a gap.
+
+    Log entries don't overlap, so streaming them by first_seen and
+    expanding one at a time yields rows in time order without holding the
+    range in memory; the output merges with the other tiers like a cursor.
+
+    Yields (symbol, borrow_amount, repay_amount, ratio, timestamp) tuples
+    within [start, end], ordered by time.
+    """
+    logs = db.session.execute(
+        db.select(SnapshotLog.first_seen, SnapshotLog.last_seen)
+        .where(SnapshotLog.first_seen <= end, SnapshotLog.last_seen >= start,
+               SnapshotLog.last_seen > SnapshotLog.first_seen)
+        .order_by(SnapshotLog.first_seen)
+        .execution_options(yield_per=1000)
+    )
+    for first_seen, last_seen in logs:
+        hours = _fill_hours(first_seen, last_seen, start, end)
+        first_hour = next(hours, None)
+        if first_hour is None:
+            continue
+
+        query = (db.select(CryptoData.symbol, CryptoData.borrow_amount,
+                           CryptoData.repay_amount, CryptoData.ratio)
+                 .where(CryptoData.timestamp == first_seen))
+        if symbol is not None:
+            query = query.where(CryptoData.symbol == symbol)
+        snapshot_rows = db.session.execute(query).all()
+
+        for hour in itertools.chain([first_hour], hours):
+            for row in snapshot_rows:
+                yield (*row, hour)
+
+def materialize_heartbeats(cutoff):
+    """
+    Store the filled-forward rows of snapshots first seen before `cutoff`,
+    so compacting their raw rows keeps one sample per stable hour.
+
+    A snapshot still being seen at the cutoff gets a copy of its rows at
+    the cutoff and is re-anchored there; older log entries are removed,
+    since their rows are about to be rolled up.
+
+    Returns the number of rows stored.
+    """
+    logs = SnapshotLog.query.filter(SnapshotLog.first_seen < cutoff).all()
+    if not logs:
+        return 0
+
+    stored = 0
+    try:
+        rows = heartbeat_rows(min(log.first_seen for log in logs), cutoff)
+        while (batch := list(itertools.islice(rows, RETENTION_BATCH_SIZE))):
+            db.session.execute(db.insert(CryptoData), [
+                {'symbol': symbol, 'borrow_amount': borrow_amount, 'repay_amount': repay_amount,
+                 'ratio': ratio, 'timestamp': timestamp}
+                for symbol, borrow_amount, repay_amount, ratio, timestamp in batch
+            ])
+            stored += len(batch)
+        for log in logs:
+            if log.last_seen >= cutoff:
+                log.first_seen = cutoff
+            else:
+                db.session.delete(log)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return stored
+
+def compact_batch(source, target, cutoff, truncate):
+    """
+    Roll one bounded batch of rows older than `cutoff` from `source` into
+    the `target` rollup table and delete them from `source`.
+
+    Batches are taken oldest first and merged into any existing rollup
+    rows, so a bucket split across batches still ends up complete. Each
+    batch is its own short transaction to avoid holding long table locks.
+
+    Returns the number of source rows compacted.
+    """
+    time_column = source.timestamp if source is CryptoData else source.bucket
+    rows = (source.query
+            .filter(time_column < cutoff)
+            .order_by(time_column, source.id)
+            .limit(RETENTION_BATCH_SIZE)
+            .all())
+    if not rows:
+        return 0
+
+    # Fold the batch into (symbol, bucket) aggregates
+    aggregates = {}
+    for row in rows:
+        if source is CryptoData:
+            timestamp, low, high, total, count, last = (
+                row.timestamp, row.ratio, row.ratio, row.ratio, 1, row.ratio)
+        else:
+            timestamp, low, high, total, count, last = (
+                row.bucket, row.ratio_min, row.ratio_max,
+                row.ratio_avg * row.samples, row.samples, row.ratio_last)
+
+        key = (row.symbol, truncate(timestamp))
+        agg = aggregates.get(key)
+        if agg is None:
+            aggregates[key] = {'min': low, 'max': high, 'sum': total, 'count': count,
+                               'last': last, 'borrow': row.borrow_amount, 'repay': row.repay_amount}
+        else:
+            agg['min'] = min(agg['min'], low)
+            agg['max'] = max(agg['max'], high)
+            agg['sum'] += total
+            agg['count'] += count
+            # Rows are ordered by time, so the latest one wins
+            agg['last'], agg['borrow'], agg['repay'] = last, row.borrow_amount, row.repay_amount
+
+    try:
+        buckets = [bucket for _, bucket in aggregates]
+        existing = {
+            (r.symbol, r.bucket): r
+            for r in target.query.filter(target.symbol.in_({s for s, _ in aggregates}),
+                                         target.bucket >= min(buckets),
+                                         target.bucket <= max(buckets))
+        }
+
+        for (symbol, bucket), agg in aggregates.items():
+            current = existing.get((symbol, bucket))
+            if current is None:
+                db.session.add(target(symbol=symbol, bucket=bucket,
+                                      ratio_min=agg['min'], ratio_max=agg['max'],
+                                      ratio_avg=agg['sum'] / agg['count'], ratio_last=agg['last'],
+                                      borrow_amount=agg['borrow'], repay_amount=agg['repay'],
+                                      samples=agg['count']))
+            else:
+                total = current.ratio_avg * current.samples + agg['sum']
+                current.samples += agg['count']
+                current.ratio_avg = total / current.samples
+                current.ratio_min = min(current.ratio_min, agg['min'])
+                current.ratio_max = max(current.ratio_max, agg['max'])
+                current.ratio_last = agg['last']
+                current.borrow_amount = agg['borrow']
+                current.repay_amount = agg['repay']
+
+        source.query.filter(source.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
         db.session.rollback()
+        raise
+
+    return len(rows)
+
+def compact_history(now=None):
+    """
+    Apply the retention policy: raw rows older than RAW_RETENTION_DAYS are
+    rolled up into hourly aggregates, and hourly aggregates older than
+    HOURLY_RETENTION_DAYS into daily ones. Stable periods are stored
+    filled forward first, so they count in the rollups' samples.
+    """
+    now = now or datetime.utcnow()
+    raw_cutoff = _floor_hour(now - timedelta(days=RAW_RETENTION_DAYS))
+    hourly_cutoff = _floor_day(now - timedelta(days=HOURLY_RETENTION_DAYS))
+
+    with app.app_context():
+        filled = materialize_heartbeats(raw_cutoff)
+
+        raw_compacted = 0
+        while (count := compact_batch(CryptoData, CryptoDataHourly, raw_cutoff, _floor_hour)):
+            raw_compacted += count
+
+        hourly_compacted = 0
+        while (count := compact_batch(CryptoDataHourly, CryptoDataDaily, hourly_cutoff, _floor_day)):
+            hourly_compacted += count
+
+    logger.info(f"Compacted {raw_compacted} raw rows ({filled} filled forward) and {hourly_compacted} hourly rows")
+    return raw_compacted, hourly_compacted
+
+def archive_closed_days(today=None):
+    """
+    Write every closed day that is not archived yet to the Parquet archive.
+    Rows are read as plain column tuples, never as ORM objects. Days
+    without rows are skipped, so rows that arrive for them later are still
+    read from the database and archived on a later run.
+    """
+    if not archive.is_available():
+        logger.warning("pyarrow not installed, skipping history archive")
+        return 0
+
+    today = today or datetime.utcnow().date()
+    archived = 0
+
+    with app.app_context():
+        first = db.session.execute(db.select(db.func.min(CryptoData.timestamp))).scalar()
+        if first is None:
+            return 0
+
+        for day in archive.closed_days(first.date(), today, archive.archived_days(ARCHIVE_DIR)):
+            day_start = datetime.combine(day, datetime.min.time())
+            rows = db.session.execute(
+                db.select(CryptoData.symbol, CryptoData.ratio, CryptoData.borrow_amount,
+                          CryptoData.repay_amount, CryptoData.timestamp)
+                .where(CryptoData.timestamp >= day_start,
+                       CryptoData.timestamp < day_start + timedelta(days=1))
+            ).all()
+            # Stable periods are archived filled forward, like they are read
+            rows += [(symbol, ratio, borrow_amount, repay_amount, timestamp)
+                     for symbol, borrow_amount, repay_amount, ratio, timestamp
+                     in heartbeat_rows(day_start, day_start + timedelta(days=1) - timedelta(microseconds=1))]
+            if not rows:
+                continue
+            archive.write_day(ARCHIVE_DIR, day, rows)
+            archived += 1
+
+    logger.info(f"Archived {archived} closed days")
+    return archived
+
+def read_ratio_rows(start, end, symbol=None):
+    """
+    Read ratio history for a time range across all retention tiers.
+
+    Each period lives in exactly one database tier (raw, hourly or daily)
+    once it has been compacted, so the tiers are read side by side and
+    merged, with stable periods filled forward from their heartbeat (see
+    heartbeat_rows). Aggregated periods report their average ratio. Days
+    older than the raw retention window that have rows in the Parquet
+    archive are read from there instead, at full resolution.
+
+    Returns a list of dicts with symbol, ratio and timestamp, ordered by time.
+    """
+    queries = [
+        db.select(CryptoData.symbol, CryptoData.ratio, CryptoData.timestamp)
+        .where(CryptoData.timestamp >= start, CryptoData.timestamp <= end)
+    ]
+    for model in (CryptoDataHourly, CryptoDataDaily):
+        queries.append(
+            db.select(model.symbol, model.ratio_avg, model.bucket)
+            .where(model.bucket >= start, model.bucket <= end)
+        )
+
+    rows = []
+    for query in queries:
+        if symbol is not None:
+            query = query.where(query.selected_columns[0] == symbol)
+        rows.extend(db.session.execute(query).all())
+    rows.extend((s, ratio, t) for s, _, _, ratio, t in heartbeat_rows(start, end, symbol))
+
+    # Serve archived days outside the hot window from the archive
+    if archive.is_available():
+        hot_start = _floor_day(datetime.utcnow() - timedelta(days=RAW_RETENTION_DAYS))
+        cold_days = {day for day in archive.archived_days(ARCHIVE_DIR)
+                     if start.date() <= day <= end.date() and day < hot_start.date()}
+        if cold_days:
+            table = archive.read_archive(ARCHIVE_DIR, start, min(end, hot_start),
+                                         [symbol] if symbol is not None else None,
+                                         ['symbol', 'ratio', 'timestamp'])
+            archived_rows = [row for row in zip(table.column('symbol').to_pylist(),
+                                                table.column('ratio').to_pylist(),
+                                                table.column('timestamp').to_pylist())
+                             if row[2].date() in cold_days]
+            # The archive only wins for days it actually has rows for
+            cold_days = {row[2].date() for row in archived_rows}
+            rows = [row for row in rows if row[2].date() not in cold_days] + archived_rows
+
+    rows.sort(key=lambda row: row[2])
+    return [{'symbol': s, 'ratio': r, 'timestamp': t} for s, r, t in rows]
 
 def get_sample_data():
     """Return sample data for demonstration purposes"""
@@ -573,28 +1384,240 @@ def generate_chart(crypto_data):
         logger.error(f"Error generating chart: {e}")
         return None
 
+def snapshot_etag(snapshot, variant):
+    """Build the ETag for a view of the given snapshot"""
+    return f"{variant}-{snapshot['id']}"
+
+def is_not_modified(snapshot, etag):
+    """
+    Check the request's conditional headers against a snapshot.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since:
+        # HTTP dates have one-second resolution
+        last_modified = snapshot['timestamp'].replace(microsecond=0, tzinfo=timezone.utc)
+        return last_modified <= request.if_modified_since
+
+    return False
+
+def add_cache_headers(response, snapshot, etag):
+    """Attach validators and a max-age matching the snapshot's remaining freshness"""
+    response.set_etag(etag)
+    response.last_modified = snapshot['timestamp'].replace(tzinfo=timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = snapshots.remaining_freshness(snapshot)
+    return response
+
+def not_modified_response(snapshot, etag):
+    """Return an empty 304 response for the given snapshot"""
+    return add_cache_headers(make_response('', 304), snapshot, etag)
+
+def stored_not_modified(variant):
+    """
+    Answer a conditional GET from the published snapshot as stored,
+    without refreshing it, so revalidations never reach the data path.
+
+    Returns a 304 response when the client already has the published
+    snapshot's view, otherwise None. A stale snapshot starts the
+    background refresher, so clients that only revalidate still see
+    new data on a later request.
+    """
+    snapshot = snapshots.get_snapshot()
+    if snapshot is None:
+        return None
+    etag = snapshot_etag(snapshot, variant)
+    if not is_not_modified(snapshot, etag):
+        return None
+    if not snapshots.is_fresh(snapshot):
+        start_snapshot_refresher()
+    return not_modified_response(snapshot, etag)
+
+def format_snapshot_timestamp(snapshot):
+    """Format a snapshot's timestamp for display"""
+    return snapshot['timestamp'].strftime("%Y-%m-%d %H:%M:%S UTC")
+
+def parse_utc_datetime(value):
+    """Parse an ISO date, converting an explicit offset (e.g. `Z`) to naive UTC like the stored timestamps"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_range_args(default_days=7):
+    """
+    Parse the `from`/`to` ISO date query arguments as naive UTC.
+    Defaults to the last `default_days` days; raises ValueError on bad
+    dates or when `from` is after `to`.
+    """
+    end = parse_utc_datetime(request.args['to']) if 'to' in request.args else datetime.utcnow()
+    start = parse_utc_datetime(request.args['from']) if 'from' in request.args else end - timedelta(days=default_days)
+    if start > end:
+        raise ValueError("`from` is after `to`")
+    return start, end
+
+EXPORT_COLUMNS = ['symbol', 'borrow_amount', 'repay_amount', 'ratio', 'timestamp']
+EXPORT_CHUNK_ROWS = 1000
+
+def iter_export_rows(start, end):
+    """
+    Yield (symbol, borrow_amount, repay_amount, ratio, timestamp) export
+    rows for a range across all retention tiers, ordered by time.
+
+    Like read_ratio_rows, stable periods are filled forward, compacted
+    periods come from the hourly and daily rollups (average ratio, last
+    borrow/repay amounts) and archived days outside the hot window from
+    the Parquet archive at full resolution.
+    Every tier is streamed (server-side cursors, one archived day at a
+    time) and merged, so memory use does not depend on the range.
+    """
+    cold_days = set()
+    if archive.is_available():
+        hot_start = _floor_day(datetime.utcnow() - timedelta(days=RAW_RETENTION_DAYS))
+        cold_days = {day for day in archive.archived_days(ARCHIVE_DIR)
+                     if start.date() <= day <= end.date() and day < hot_start.date()}
+
+    def database_rows(query):
+        result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for row in result:
+            if row[4].date() not in cold_days:
+                yield tuple(row)
+
+    def archived_rows():
+        for day in sorted(cold_days):
+            day_start = datetime.combine(day, datetime.min.time())
+            table = archive.read_archive(ARCHIVE_DIR, max(start, day_start),
+                                         min(end, day_start + timedelta(days=1) - timedelta(microseconds=1)),
+                                         columns=['symbol', 'borrow_amount', 'repay_amount', 'ratio', 'timestamp'])
+            table = table.sort_by('timestamp')
+            yield from zip(*(table.column(column).to_pylist() for column in table.column_names))
+
+    sources = [
+        database_rows(
+            db.select(CryptoData.symbol, CryptoData.borrow_amount, CryptoData.repay_amount,
+                      CryptoData.ratio, CryptoData.timestamp)
+            .where(CryptoData.timestamp >= start, CryptoData.timestamp <= end)
+            .order_by(CryptoData.timestamp)
+        ),
+        archived_rows(),
+        (row for row in heartbeat_rows(start, end) if row[4].date() not in cold_days)
+    ]
+    for model in (CryptoDataHourly, CryptoDataDaily):
+        sources.append(database_rows(
+            db.select(model.symbol, model.borrow_amount, model.repay_amount,
+                      model.ratio_avg, model.bucket)
+            .where(model.bucket >= start, model.bucket <= end)
+            .order_by(model.bucket)
+        ))
+
+    return heapq.merge(*sources, key=lambda row: row[4])
+
+def iter_export_chunks(start, end, fmt):
+    """
+    Yield the export body in chunks of EXPORT_CHUNK_ROWS rows, read from
+    every retention tier by iter_export_rows.
+    """
+    rows = iter_export_rows(start, end)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        while (chunk := list(itertools.islice(rows, EXPORT_CHUNK_ROWS))):
+            for symbol, borrow_amount, repay_amount, ratio, timestamp in chunk:
+                writer.writerow([symbol, borrow_amount, repay_amount, ratio, timestamp.isoformat()])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        while (chunk := list(itertools.islice(rows, EXPORT_CHUNK_ROWS))):
+            yield ''.join(
+                json.dumps({'symbol': symbol, 'borrow_amount': borrow_amount, 'repay_amount': repay_amount,
+                            'ratio': ratio, 'timestamp': timestamp.isoformat()}) + '\n'
+                for symbol, borrow_amount, repay_amount, ratio, timestamp in chunk
+            )
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip stream"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
 # Routes
 @app.route('/')
 def index():
     """Display the homepage with crypto borrow/repay ratio data"""
-    crypto_data = fetch_crypto_borrow_data()
-    chart_json = generate_chart(crypto_data)
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-    return render_template('index.html', 
-                           crypto_data=crypto_data, 
-                           chart_json=chart_json,
-                           timestamp=timestamp)
+    encoding = 'gzip' if request.accept_encodings['gzip'] else 'identity'
+    # Each encoding is a different representation and gets its own ETag
+    variant = 'index' if encoding == 'identity' else f'index-{encoding}'
+    not_modified = stored_not_modified(variant)
+    if not_modified is not None:
+        return not_modified
+
+    snapshot = get_current_snapshot()
+    etag = snapshot_etag(snapshot, variant)
+    if is_not_modified(snapshot, etag):
+        return not_modified_response(snapshot, etag)
+
+    page = index_page_cache.get(snapshot['id'])
+    if page is None:
+        crypto_data = snapshot['data']
+        chart_json = generate_chart(crypto_data)
+        body = render_template('index.html',
+                               crypto_data=crypto_data,
+                               chart_json=chart_json,
+                               snapshot_id=snapshot['id'],
+                               timestamp=format_snapshot_timestamp(snapshot))
+        page = index_page_cache.put(snapshot['id'], body.encode('utf-8'))
+
+    response = make_response(page[encoding])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return add_cache_headers(response, snapshot, etag)
 
 @app.route('/api/crypto-data')
 def api_crypto_data():
     """API endpoint to get crypto data in JSON format"""
     try:
-        crypto_data = fetch_crypto_borrow_data()
-        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-        return jsonify({
-            'timestamp': timestamp,
-            'data': crypto_data
+        since = request.args.get('since', type=int)
+        variant = 'api' if since is None else f'api-since-{since}'
+        not_modified = stored_not_modified(variant)
+        if not_modified is not None:
+            return not_modified
+
+        snapshot = get_current_snapshot()
+        etag = snapshot_etag(snapshot, variant)
+        if is_not_modified(snapshot, etag):
+            return not_modified_response(snapshot, etag)
+
+        # Clients that already hold a snapshot only need what changed since
+        delta = snapshots.get_delta(since) if since is not None else None
+        if delta is not None and delta['id'] == snapshot['id']:
+            response = jsonify({
+                'snapshot_id': snapshot['id'],
+                'base_id': delta['base_id'],
+                'timestamp': format_snapshot_timestamp(snapshot),
+                'full': False,
+                'inserted': delta['inserted'],
+                'updated': delta['updated'],
+                'removed': delta['removed']
+            })
+            return add_cache_headers(response, snapshot, etag)
+
+        response = jsonify({
+            'snapshot_id': snapshot['id'],
+            'timestamp': format_snapshot_timestamp(snapshot),
+            'full': True,
+            'data': snapshot['data']
         })
+        return add_cache_headers(response, snapshot, etag)
     except Exception as e:
         logger.error(f"API error: {e}")
         # Try to get cached data if fetch fails
@@ -608,22 +1631,147 @@ def api_crypto_data():
         except Exception:
             return jsonify({"error": str(e)}), 500
 
+@app.route('/api/stream')
+def api_stream():
+    """Server-Sent Events stream of newly published snapshots"""
+    start_snapshot_refresher()
+    snapshot_stream.max_clients = stream_client_limit()
+    response = app.response_class(
+        snapshot_stream.stream(request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/history/<symbol>')
+def api_symbol_history(symbol):
+    """API endpoint returning one symbol's ratio history, downsampled server-side"""
+    try:
+        start, end = parse_range_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {e}"}), 400
+
+    points = min(max(request.args.get('points', 500, type=int), 3), 5000)
+    symbol = symbol.upper()
+
+    # Older ranges come back from the hourly/daily rollups instead of raw rows
+    rows = read_ratio_rows(start, end, symbol)
+
+    epoch = datetime(1970, 1, 1)
+    series = lttb([((row['timestamp'] - epoch).total_seconds(), row['ratio']) for row in rows], points)
+    return jsonify({
+        'symbol': symbol,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'raw_count': len(rows),
+        'points': [
+            {'timestamp': (epoch + timedelta(seconds=x)).isoformat(), 'ratio': y}
+            for x, y in series
+        ]
+    })
+
+@app.route('/api/export')
+def api_export():
+    """Stream history rows from every retention tier as CSV or NDJSON, optionally gzip-compressed"""
+    try:
+        start, end = parse_range_args()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid range: {e}"}), 400
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    chunks = stream_with_context(iter_export_chunks(start, end, fmt))
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"crypto_history_{start.date()}_{end.date()}.{fmt}"
+
+    if request.args.get('gzip', 0, type=int):
+        response = app.response_class(gzip_chunks(chunks), mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(chunks, mimetype=mimetype)
+
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@app.route('/api/exchange-data')
+def api_exchange_data():
+    """Merged funding, open interest and borrow rates for every symbol (real-data mode)"""
+    if not REAL_DATA_MODE:
+        return jsonify({"error": "Real-data mode is disabled"}), 404
+    try:
+        return jsonify({'data': get_exchange_view()})
+    except Exception as e:
+        logger.error(f"Error fetching exchange data: {e}")
+        return jsonify({"error": "Exchange data unavailable"}), 503
+
+@app.route('/api/anomalies')
+def api_anomalies():
+    """
+    Anomalies detected after the given ID, oldest first. Consumers keep the
+    returned last_id and pass it as `after` on their next poll.
+    """
+    after = request.args.get('after', type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    try:
+        last_id = db.session.query(db.func.max(Anomaly.id)).scalar() or 0
+        if after is None:
+            # Without a cursor, return the most recent ones
+            rows = Anomaly.query.order_by(Anomaly.id.desc()).limit(limit).all()[::-1]
+        else:
+            rows = (Anomaly.query.filter(Anomaly.id > after)
+                    .order_by(Anomaly.id).limit(limit).all())
+            if rows:
+                last_id = rows[-1].id
+        return jsonify({'data': [row.to_dict() for row in rows], 'last_id': last_id})
+    except Exception as e:
+        logger.error(f"Error reading anomalies: {e}")
+        return jsonify({"error": "Anomalies unavailable"}), 503
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Operational counters for the web process"""
+    return jsonify({
+        'singleflight': upstream_fetches.metrics(),
+        'coingecko_quota': coingecko_quota.status(),
+        'refresh_interval': refresh_cadence.interval,
+        'stream_clients': snapshot_stream.client_count,
+        'write_behind_depth': persistence_queue.depth,
+        'write_behind_dropped': persistence_queue.dropped,
+        'anomaly_queue_depth': anomaly_queue.depth,
+        'anomaly_symbols': len(anomaly_detector)
+    })
+
 @app.route('/history')
 def history():
     """Show historical data from the database"""
     days = request.args.get('days', 7, type=int)
+
+    # History only changes when a new snapshot is saved
+    not_modified = stored_not_modified(f'history-{days}')
+    if not_modified is not None:
+        return not_modified
+
+    snapshot = get_current_snapshot()
+    etag = snapshot_etag(snapshot, f'history-{days}')
+    if is_not_modified(snapshot, etag):
+        return not_modified_response(snapshot, etag)
     
     with app.app_context():
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get the data from database
-        historical_data = CryptoData.query.filter(CryptoData.timestamp > cutoff_date).all()
+        # Get the data from database, at whatever resolution retention left it
+        historical_data = read_ratio_rows(cutoff_date, datetime.utcnow())
         
         # Group by day and symbol
-        df = pd.DataFrame([d.to_dict() for d in historical_data])
+        df = pd.DataFrame(historical_data)
         
         if df.empty:
-            return render_template('history.html', has_data=False, days=days)
+            response = make_response(render_template('history.html', has_data=False, days=days))
+            return add_cache_headers(response, snapshot, etag)
             
         # Convert timestamp to datetime if it's a string
         if isinstance(df['timestamp'].iloc[0], str):
@@ -633,58 +1781,33 @@ def history():
         df['date'] = df['timestamp'].dt.date
         
         # For each date, get the top symbols by ratio
-        dates = sorted(df['date'].unique())
-        
-        # Prepare data for charts
-        date_data = []
-        for date in dates:
-            day_data = df[df['date'] == date]
+        payloads = []
+        for date, day_data in df.groupby('date', sort=True):
             # Filter for ratio > 10
-            filtered_day_data = day_data[day_data['ratio'] > 10]
+            filtered_day_data = day_data[day_data['ratio'] > RANKING_MIN_RATIO]
             # If we have enough data with ratio > 10, use that, otherwise use top 20
             if len(filtered_day_data) > 0:
-                top_symbols = filtered_day_data.sort_values('ratio', ascending=False).head(20)
+                top_symbols = filtered_day_data.nlargest(RANKING_SIZE, 'ratio')
             else:
-                top_symbols = day_data.sort_values('ratio', ascending=False).head(20)
-            
-            # Generate chart for this day
-            fig = px.bar(
-                top_symbols, 
-                x='symbol', 
-                y='ratio', 
-                title=f'Cryptocurrencies with Borrow/Repay Ratio > 10 on {date}',
-                labels={'symbol': 'Cryptocurrency', 'ratio': 'Borrow/Repay Ratio'},
-                color='ratio',
-                color_continuous_scale='Viridis',
-                text='ratio'
-            )
-            
-            # Update layout
-            fig.update_layout(
-                template='plotly_dark',
-                xaxis_title='Cryptocurrency',
-                yaxis_title='Borrow/Repay Ratio',
-                coloraxis_showscale=False,
-                height=400
-            )
-            
-            # Format the text labels
-            fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-            
-            # Convert to JSON
-            chart_json = pu.PlotlyJSONEncoder().encode(fig)
-            
-            date_data.append({
-                'date': date,
-                'chart_json': chart_json
-            })
-    
-        return render_template('history.html', 
-                               has_data=True,
-                               date_data=date_data,
-                               days=days)
+                top_symbols = day_data.nlargest(RANKING_SIZE, 'ratio')
+
+            payloads.append((str(date), top_symbols['symbol'].tolist(), top_symbols['ratio'].tolist()))
 
+        def iter_date_data():
+            # Build charts for days not seen before, in parallel, and hand
+            # each one to the template as soon as it is ready
+            lease = (charts.lease_pool(CHART_WORKERS, CHART_TASKS_PER_CHILD)
+                     if CHART_WORKERS > 1 else contextlib.nullcontext())
+            with lease as pool:
+                for date, chart_json in charts.build_day_charts(payloads, day_chart_cache, pool):
+                    yield {'date': date, 'chart_json': chart_json}
 
+        # Stream the page so the first days render while later ones are built
+        response = app.response_class(stream_template('history.html',
+                                                      has_data=True,
+                                                      date_data=iter_date_data(),
+                                                      days=days))
+        return add_cache_headers(response, snapshot, etag)
 
 @app.route('/about')
 def about():
@@ -699,6 +1822,110 @@ with app.app_context():
     except Exception as e:
         logger.info(f"Tables may already exist, continuing: {e}")
 
+    # create_all() skips indexes on tables that already exist
+    try:
+        for index in CryptoData.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+    except Exception as e:
+        logger.warning(f"Could not create indexes: {e}")
+
+# Periodic maintenance jobs
+maintenance_scheduler = BackgroundScheduler(daemon=True)
+
+def start_maintenance_jobs():
+    """
+    Schedule history compaction and the nightly archive in the background.
+    Called by the serving entrypoints only, so CLI commands, backfills and
+    chart workers that import this module don't each run a compactor.
+    """
+    if not MAINTENANCE_JOBS_ENABLED or maintenance_scheduler.running:
+        return
+    maintenance_scheduler.add_job(compact_history, 'interval', minutes=MAINTENANCE_INTERVAL_MINUTES,
+                                  id='compact_history', max_instances=1, coalesce=True)
+    maintenance_scheduler.add_job(archive_closed_days, 'cron', hour=0, minute=15, timezone='UTC',
+                                  id='archive_closed_days', max_instances=1, coalesce=True)
+    maintenance_scheduler.start()
+    logger.info(f"Maintenance jobs scheduled every {MAINTENANCE_INTERVAL_MINUTES} minutes")
+
+def save_backfill_rows(rows):
+    """
+    Bulk-insert backfilled (symbol, ratio, borrow_amount, repay_amount, timestamp)
+    rows into crypto_data. Rows already stored for the same symbol and time
+    are replaced, so replaying a page after an interrupted run is harmless.
+    """
+    by_symbol = {}
+    for row in rows:
+        by_symbol.setdefault(row[0], []).append(row[4])
+
+    with app.app_context():
+        try:
+            for symbol, timestamps in by_symbol.items():
+                for i in range(0, len(timestamps), 500):
+                    db.session.execute(
+                        db.delete(CryptoData)
+                        .where(CryptoData.symbol == symbol,
+                               CryptoData.timestamp.in_(timestamps[i:i + 500]))
+                    )
+            db.session.execute(db.insert(CryptoData), [{
+                'symbol': symbol,
+                'ratio': ratio,
+                'borrow_amount': borrow_amount,
+                'repay_amount': repay_amount,
+                'timestamp': timestamp
+            } for symbol, ratio, borrow_amount, repay_amount, timestamp in rows])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+def archive_backfill_rows(rows):
+    """Merge backfilled rows into their days' Parquet partitions"""
+    by_day = {}
+    for row in rows:
+        by_day.setdefault(row[4].date(), []).append(row)
+    for day, day_rows in sorted(by_day.items()):
+        archive.merge_day(ARCHIVE_DIR, day, day_rows)
+
+@app.cli.command('backfill-history')
+@click.option('--exchange', 'exchanges', multiple=True, default=['binance'], show_default=True,
+              help='CCXT exchange ID; repeat for more, in order of preference.')
+@click.option('--symbol', 'markets', multiple=True, required=True,
+              help='Market symbol such as BTC/USDT; repeat for more.')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='First day to backfill (UTC).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day to backfill (UTC). Defaults to now.')
+@click.option('--timeframe', type=click.Choice(['1d', '1h']), default='1d', show_default=True)
+@click.option('--target', type=click.Choice(['database', 'archive']), default='database', show_default=True,
+              help='Insert into crypto_data or merge into the Parquet archive.')
+@click.option('--checkpoint', 'checkpoint_path', default=None,
+              help='Progress file for resuming. Defaults to backfill-<target>-<timeframe>.json.')
+def backfill_history_command(exchanges, markets, start, end, timeframe, target, checkpoint_path):
+    """Backfill historical candles from exchanges, resuming from the checkpoint."""
+    if target == 'archive' and not archive.is_available():
+        raise click.ClickException("pyarrow is not installed, the archive is unavailable")
+
+    end = end + timedelta(days=1) - timedelta(milliseconds=1) if end else datetime.utcnow()
+    checkpoint = backfill.Checkpoint(checkpoint_path or f"backfill-{target}-{timeframe}.json")
+    writer = archive_backfill_rows if target == 'archive' else save_backfill_rows
+    # Hourly archive pages touch many partitions, so merge them in bigger batches
+    sink = backfill.BackfillSink(writer, checkpoint, flush_rows=100000 if target == 'archive' else 10000)
+
+    candles = backfill.run_backfill(list(exchanges), list(markets), start, end, timeframe, sink)
+    print(f"Fetched {candles} candles, wrote {sink.rows_written} rows to the {target}")
+
+@app.cli.command('compact-history')
+def compact_history_command():
+    """Apply the history retention policy now."""
+    raw_compacted, hourly_compacted = compact_history()
+    print(f"Compacted {raw_compacted} raw rows and {hourly_compacted} hourly rows")
+
+@app.cli.command('archive-history')
+def archive_history_command():
+    """Archive closed days to Parquet now."""
+    print(f"Archived {archive_closed_days()} days")
+
 # Run the app
 if __name__ == '__main__':
+    start_maintenance_jobs()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
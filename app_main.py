@@ -1,5 +1,5 @@
 import logging
-from app import app
+from app import app, start_maintenance_jobs
 
 # Configure logging
 logging.basicConfig(
@@ -10,5 +10,9 @@ logger = logging.getLogger(__name__)
 
 # This file is used by Replit to run the Flask application
 # The app is configured in app.py
+
+# Only the serving process runs history maintenance
+start_maintenance_jobs()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
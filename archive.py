@@ -0,0 +1,185 @@
+"""
+Module for the columnar Parquet archive of historical crypto data
+
+Closed days are written to date-partitioned Parquet files
+(<archive_dir>/date=YYYY-MM-DD/part-0.parquet) with typed columns, and read
+back with predicate pushdown on date and symbol. pyarrow is optional; when
+it is not installed the archive is disabled and callers fall back to the
+database.
+"""
+
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['symbol', 'ratio', 'borrow_amount', 'repay_amount', 'timestamp']
+
+def is_available() -> bool:
+    """Check whether pyarrow is installed so the archive can be used."""
+    return pa is not None
+
+def _schema():
+    return pa.schema([
+        ('symbol', pa.string()),
+        ('ratio', pa.float64()),
+        ('borrow_amount', pa.float64()),
+        ('repay_amount', pa.float64()),
+        ('timestamp', pa.timestamp('us')),
+    ])
+
+def _partition_dir(archive_dir: str, day: date) -> str:
+    return os.path.join(archive_dir, f"date={day.isoformat()}")
+
+# Partition path -> (mtime_ns, row count), so listing the archive doesn't
+# reopen every file
+_row_counts: Dict[str, Tuple[int, int]] = {}
+
+def _row_count(path: str) -> int:
+    mtime = os.stat(path).st_mtime_ns
+    cached = _row_counts.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _row_counts[path] = (mtime, pq.read_metadata(path).num_rows)
+    return cached[1]
+
+def archived_days(archive_dir: str) -> Set[date]:
+    """
+    Return the days that have rows in the archive.
+
+    An empty partition doesn't count, so a day with no archived rows is
+    still served from (and archived again from) the database.
+
+    Args:
+        archive_dir: Root directory of the archive
+
+    Returns:
+        A set of archived dates
+    """
+    days = set()
+    if not os.path.isdir(archive_dir):
+        return days
+
+    for name in os.listdir(archive_dir):
+        path = os.path.join(archive_dir, name, 'part-0.parquet')
+        if name.startswith('date=') and os.path.exists(path):
+            try:
+                day = date.fromisoformat(name[len('date='):])
+            except ValueError:
+                logger.warning(f"Ignoring unexpected archive directory: {name}")
+                continue
+            if _row_count(path):
+                days.add(day)
+    return days
+
+def write_day(archive_dir: str, day: date, rows: Iterable[tuple]) -> int:
+    """
+    Write one closed day to its Parquet partition.
+
+    Rows are written sorted by symbol then time, which keeps row-group
+    statistics tight for symbol filters. The file is written under a
+    temporary name and renamed, so readers never see a partial day.
+
+    Args:
+        archive_dir: Root directory of the archive
+        day: The day being archived
+        rows: (symbol, ratio, borrow_amount, repay_amount, timestamp) tuples
+
+    Returns:
+        The number of rows written
+    """
+    rows = sorted(rows, key=lambda row: (row[0], row[4]))
+    columns = list(zip(*rows)) if rows else [[] for _ in COLUMNS]
+    table = pa.Table.from_arrays([pa.array(col) for col in columns], schema=_schema())
+
+    partition = _partition_dir(archive_dir, day)
+    os.makedirs(partition, exist_ok=True)
+    # Dot-prefixed files are skipped by dataset discovery
+    temp_path = os.path.join(partition, '.part-0.parquet.tmp')
+    pq.write_table(table, temp_path, compression='zstd')
+    os.replace(temp_path, os.path.join(partition, 'part-0.parquet'))
+
+    logger.info(f"Archived {len(rows)} rows for {day}")
+    return len(rows)
+
+def merge_day(archive_dir: str, day: date, rows: Iterable[tuple]) -> int:
+    """
+    Merge rows into a day's partition, replacing archived rows with the
+    same symbol and timestamp, and rewrite it.
+
+    Args:
+        archive_dir: Root directory of the archive
+        day: The day the rows belong to
+        rows: (symbol, ratio, borrow_amount, repay_amount, timestamp) tuples
+
+    Returns:
+        The number of rows in the partition afterwards
+    """
+    merged = {}
+    path = os.path.join(_partition_dir(archive_dir, day), 'part-0.parquet')
+    if os.path.exists(path):
+        existing = pq.read_table(path, columns=COLUMNS).to_pydict()
+        for row in zip(*(existing[column] for column in COLUMNS)):
+            merged[(row[0], row[4])] = row
+    for row in rows:
+        merged[(row[0], row[4])] = tuple(row)
+    return write_day(archive_dir, day, merged.values())
+
+def read_archive(archive_dir: str, start: datetime, end: datetime,
+                 symbols: Optional[List[str]] = None,
+                 columns: Optional[List[str]] = None):
+    """
+    Read archived rows for a time range.
+
+    The date partitions outside the range are never opened, and the
+    symbol and timestamp filters are pushed down to the Parquet reader.
+
+    Args:
+        archive_dir: Root directory of the archive
+        start: Start of the range (inclusive)
+        end: End of the range (inclusive)
+        symbols: Optional list of symbols to keep
+        columns: Optional list of columns to read (default: all)
+
+    Returns:
+        A pyarrow Table; call .to_pandas() for a DataFrame
+    """
+    if not archived_days(archive_dir):
+        return _schema().empty_table().select(columns or COLUMNS)
+
+    dataset = ds.dataset(
+        archive_dir,
+        format='parquet',
+        schema=_schema().append(pa.field('date', pa.date32())),
+        partitioning=ds.partitioning(pa.schema([('date', pa.date32())]), flavor='hive')
+    )
+
+    expression = (
+        (ds.field('date') >= start.date()) &
+        (ds.field('date') <= end.date()) &
+        (ds.field('timestamp') >= pa.scalar(start, type=pa.timestamp('us'))) &
+        (ds.field('timestamp') <= pa.scalar(end, type=pa.timestamp('us')))
+    )
+    if symbols:
+        expression = expression & ds.field('symbol').isin(symbols)
+
+    return dataset.to_table(columns=columns or COLUMNS, filter=expression)
+
+def closed_days(first_day: date, today: date, done: Set[date]) -> List[date]:
+    """Return the days from first_day up to yesterday that still need archiving."""
+    days = []
+    day = first_day
+    while day < today:
+        if day not in done:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
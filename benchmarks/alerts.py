@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark for evaluating alert rules against snapshots
+
+Loads 1M rules (per-symbol and any-coin, both directions) and times
+evaluating a stream of snapshots in which every symbol's ratio drifts a
+little, against checking every rule on every snapshot. Run from the
+repository root:
+
+    python benchmarks/alerts.py [rule_count]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import alerts
+
+SYMBOLS = [f"SYM{n}" for n in range(500)]
+SNAPSHOTS = 50
+
+def make_rules(count):
+    """Random rules: 90% for one symbol, 10% for any coin"""
+    rng = random.Random(count)
+    for rule_id in range(1, count + 1):
+        symbol = alerts.ANY if rng.random() < 0.1 else rng.choice(SYMBOLS)
+        op = alerts.ABOVE if rng.random() < 0.7 else alerts.BELOW
+        yield alerts.AlertRule(rule_id, rng.randrange(100000), symbol, op, round(rng.uniform(10, 500), 1))
+
+def make_snapshots():
+    """Snapshots of all symbols, each ratio moving up to 2% per snapshot"""
+    rng = random.Random(0)
+    ratios = {symbol: rng.uniform(10, 500) for symbol in SYMBOLS}
+    snapshots = []
+    for _ in range(SNAPSHOTS):
+        for symbol in SYMBOLS:
+            ratios[symbol] *= 1 + rng.uniform(-0.02, 0.02)
+        snapshots.append([{'symbol': symbol, 'ratio': ratio} for symbol, ratio in ratios.items()])
+    return snapshots
+
+def scan_all(rules, previous, snapshot):
+    """Baseline: check every rule against every symbol it applies to"""
+    crossed = 0
+    for row in snapshot:
+        old, new = previous[row['symbol']], row['ratio']
+        for rule in rules:
+            if rule.symbol != alerts.ANY and rule.symbol != row['symbol']:
+                continue
+            if rule.op == alerts.ABOVE and old <= rule.threshold < new:
+                crossed += 1
+            elif rule.op == alerts.BELOW and new < rule.threshold <= old:
+                crossed += 1
+    return crossed
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rules = list(make_rules(count))
+    snapshots = make_snapshots()
+
+    engine = alerts.AlertEngine(hysteresis=0.05, cooldown_seconds=0)
+    started = time.perf_counter()
+    engine.add_rules(rules)
+    print(f"Loaded {count:,} rules in {time.perf_counter() - started:.2f}s")
+
+    engine.evaluate(snapshots[0], now=0)
+    fired = 0
+    started = time.perf_counter()
+    for i, snapshot in enumerate(snapshots[1:], 1):
+        fired += len(engine.evaluate(snapshot, now=i))
+    elapsed = time.perf_counter() - started
+    print(f"Indexed:   {elapsed / (SNAPSHOTS - 1) * 1000:8.2f} ms/snapshot, "
+          f"{fired // (SNAPSHOTS - 1):,} alerts/snapshot")
+
+    # The full scan is far slower; time one snapshot only
+    previous = {row['symbol']: row['ratio'] for row in snapshots[0]}
+    started = time.perf_counter()
+    crossed = scan_all(rules, previous, snapshots[1])
+    elapsed = time.perf_counter() - started
+    print(f"Full scan: {elapsed * 1000:8.2f} ms/snapshot, {crossed:,} crossings (no hysteresis)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark for building the per-day /history charts
+
+Times building 7, 30 and 365 days of charts sequentially, in the process
+pool, and again from a warm cache. Run from the repository root:
+
+    python benchmarks/history_charts.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import charts
+from config import CHART_WORKERS, CHART_TASKS_PER_CHILD
+
+def make_payloads(days):
+    """Build synthetic (day, symbols, ratios) payloads with 20 bars each"""
+    rng = random.Random(days)
+    start = date.today() - timedelta(days=days)
+    return [
+        (str(start + timedelta(days=i)),
+         [f"SYM{n}" for n in range(20)],
+         sorted((round(rng.uniform(10, 50), 2) for _ in range(20)), reverse=True))
+        for i in range(days)
+    ]
+
+def timed(label, payloads, cache, pool=None):
+    started = time.perf_counter()
+    for _ in charts.build_day_charts(payloads, cache, pool):
+        pass
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<12} {elapsed:8.2f}s")
+
+def main():
+    with charts.lease_pool(CHART_WORKERS, CHART_TASKS_PER_CHILD) as pool:
+        # Warm up the workers so process start-up isn't counted
+        list(pool.map(charts.build_day_chart, *zip(*make_payloads(CHART_WORKERS))))
+
+        for days in (7, 30, 365):
+            payloads = make_payloads(days)
+            print(f"{days} days ({CHART_WORKERS} workers):")
+            timed("sequential", payloads, charts.DayChartCache())
+            cache = charts.DayChartCache()
+            timed("pool", payloads, cache, pool)
+            timed("cached", payloads, cache, pool)
+
+    pool.shutdown()
+
+if __name__ == "__main__":
+    main()
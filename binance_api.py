@@ -1,15 +1,31 @@
 """
 Module for fetching and processing Binance margin data
+
+fetch_margin_rows() returns parsed, typed rows that the web app and the
+bots can both use; render_margin_table() turns them into the Telegram
+<pre> table and caches the result per distinct set of rows.
 """
 
 import requests
 import logging
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import List, Optional, Tuple, TypedDict
+
+from config import BINANCE_API_BASE_URL
+from ranking import top_k
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+class MarginRow(TypedDict):
+    """One asset's daily margin borrow/repay totals"""
+    symbol: str
+    borrow_amount: float
+    repay_amount: float
+    ratio: float
+
 # Cached data
+_cached_rows: List[MarginRow] = []
 _cached_data = "Данные ещё не загружены."
 
 def get_cached_data() -> str:
@@ -17,60 +33,107 @@ def get_cached_data() -> str:
     global _cached_data
     return _cached_data
 
-def fetch_margin_data() -> str:
+def get_cached_rows() -> List[MarginRow]:
+    """Return the rows behind the currently cached margin data."""
+    return _cached_rows
+
+def parse_margin_rows(data: List[dict]) -> List[MarginRow]:
+    """
+    Parse the raw API items into rows, in API order.
+    Items without a repaid amount count as having repaid 1, as before.
+    """
+    rows = []
+    for item in data:
+        borrowed = float(item.get('totalBorrowed', 0) or 0)
+        repaid = float(item.get('totalRepaid', 1)) if item.get('totalRepaid') else 1
+        rows.append(MarginRow(
+            symbol=item['asset'],
+            borrow_amount=borrowed,
+            repay_amount=repaid,
+            ratio=round(borrowed / repaid, 1) if repaid else 0
+        ))
+    return rows
+
+def fetch_margin_rows() -> List[MarginRow]:
     """
     Fetch margin trading data from Binance API.
-    Returns formatted string with top 10 assets by borrowed amount.
+
+    Returns:
+        Every asset's borrow/repay totals
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails
+        ValueError: If the API returns no data
     """
-    url = "https://www.binance.com/bapi/earn/v1/private/lending/margin/market"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
         "Content-Type": "application/json",
         "Accept": "application/json"
     }
-    
+
+    logger.info("Fetching margin data from Binance API")
+    response = requests.get(BINANCE_API_BASE_URL, headers=headers, timeout=10)
+    response.raise_for_status()  # Raise exception for 4XX/5XX responses
+
+    data = response.json().get('data', [])
+    if not data:
+        raise ValueError("Received empty data from Binance API")
+    return parse_margin_rows(data)
+
+@lru_cache(maxsize=16)
+def _render_table(top: Tuple[Tuple[str, float, float, float], ...]) -> str:
+    # Format the data into a readable table
+    output = "📊 TOP 10 ASSETS BY BORROWED AMOUNT\n"
+    output += "ASSET      BOR.D   REP.D     B/R\n"
+    output += "-------------------------------\n"
+
+    for asset, borrowed, repaid, ratio in top:
+        output += f"{asset:<10} {borrowed/1e6:>6.1f}M  {repaid/1e6:>6.1f}M  {ratio:>6}\n"
+
+    # Add timestamp and footer
+    output += "\nBOR.D = Borrowed (Daily), REP.D = Repaid (Daily), B/R = Borrowed/Repaid Ratio"
+
+    return f"<pre>{output}</pre>"
+
+def render_margin_table(rows: List[MarginRow], limit: int = 10) -> str:
+    """
+    Render the top `limit` rows by borrowed amount as a Telegram <pre> table.
+    Identical rows reuse the previously rendered table.
+    """
+    top = top_k(rows, limit, key='borrow_amount')
+    return _render_table(tuple(
+        (row['symbol'], row['borrow_amount'], row['repay_amount'], row['ratio']) for row in top
+    ))
+
+def fetch_margin_data() -> str:
+    """
+    Fetch margin trading data from Binance API.
+    Returns formatted string with top 10 assets by borrowed amount.
+    """
     try:
-        logger.info("Fetching margin data from Binance API")
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()  # Raise exception for 4XX/5XX responses
-        
-        data = response.json().get('data', [])
-        
-        if not data:
-            logger.warning("Received empty data from Binance API")
-            return "<pre>❌ Получены пустые данные от Binance API</pre>"
-            
-        # Sort by total borrowed amount (descending) and take top 10
-        top_assets = sorted(data, key=lambda x: float(x.get('totalBorrowed', 0)), reverse=True)[:10]
-        
-        # Format the data into a readable table
-        output = "📊 TOP 10 ASSETS BY BORROWED AMOUNT\n"
-        output += "ASSET      BOR.D   REP.D     B/R\n"
-        output += "-------------------------------\n"
-        
-        for item in top_assets:
-            asset = item['asset']
-            borrowed = float(item.get('totalBorrowed', 0))
-            repaid = float(item.get('totalRepaid', 1)) if item.get('totalRepaid') else 1
-            ratio = round(borrowed / repaid, 1)
-            
-            output += f"{asset:<10} {borrowed/1e6:>6.1f}M  {repaid/1e6:>6.1f}M  {ratio:>6}\n"
-        
-        # Add timestamp and footer
-        output += "\nBOR.D = Borrowed (Daily), REP.D = Repaid (Daily), B/R = Borrowed/Repaid Ratio"
-        
-        return f"<pre>{output}</pre>"
-        
+        return render_margin_table(fetch_margin_rows())
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching data from Binance API: {e}")
         return f"<pre>❌ Ошибка при получении данных с Binance API: {str(e)}</pre>"
+    except ValueError as e:
+        logger.warning(str(e))
+        return "<pre>❌ Получены пустые данные от Binance API</pre>"
     except Exception as e:
         logger.error(f"Unexpected error processing margin data: {e}")
         return f"<pre>❌ Неожиданная ошибка: {str(e)}</pre>"
 
-def update_cached_data() -> None:
-    """Update the cached margin data."""
-    global _cached_data
+def update_cached_data() -> Optional[List[MarginRow]]:
+    """Update the cached margin data and rows."""
+    global _cached_data, _cached_rows
     logger.info("Updating cached margin data...")
-    _cached_data = fetch_margin_data()
+    try:
+        _cached_rows = fetch_margin_rows()
+    except Exception as e:
+        logger.error(f"Error updating margin data: {e}")
+        # Keep serving the last good table, if there is one
+        if not _cached_rows:
+            _cached_data = f"<pre>❌ Ошибка при получении данных с Binance API: {str(e)}</pre>"
+        return None
+    _cached_data = render_margin_table(_cached_rows)
     logger.info("Margin data cache updated successfully")
+    return _cached_rows
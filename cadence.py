@@ -0,0 +1,105 @@
+"""
+Module for adapting the data refresh interval to market movement
+
+After every refresh the caller reports how much the data changed. Busy
+markets halve the interval down to a minimum; quiet ones stretch it up
+to a maximum. The interval is never shorter than the rate at which the
+remaining upstream quota can be spent until the end of the month.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def _symbol(item: Dict) -> str:
+    # Direct CoinGecko rows in the bots use the legacy 'asset' key
+    return item.get('symbol') or item.get('asset')
+
+def change_score(previous: List[Dict], current: List[Dict]) -> float:
+    """
+    Measure how much a ranking changed between two fetches.
+
+    Returns the mean relative change in ratio across every symbol in
+    either list, where a symbol entering or leaving the list counts as a
+    full change (1.0). Identical data scores 0.
+    """
+    before = {_symbol(item): item.get('ratio', 0) or 0 for item in previous or []}
+    after = {_symbol(item): item.get('ratio', 0) or 0 for item in current or []}
+    symbols = before.keys() | after.keys()
+    if not symbols:
+        return 0.0
+
+    total = 0.0
+    for symbol in symbols:
+        if symbol not in before or symbol not in after:
+            total += 1.0
+        else:
+            old, new = before[symbol], after[symbol]
+            total += min(1.0, abs(new - old) / abs(old)) if old else (1.0 if new else 0.0)
+    return total / len(symbols)
+
+class AdaptiveCadence:
+    """
+    Refresh interval that shortens when data moves and lengthens when it
+    doesn't, bounded by min_seconds/max_seconds and by the quota.
+    """
+
+    def __init__(self, min_seconds: float, max_seconds: float, initial_seconds: Optional[float] = None,
+                 high_change: float = 0.05, low_change: float = 0.005,
+                 speedup: float = 0.5, slowdown: float = 1.5, quota=None, name: str = "refresh"):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.high_change = high_change
+        self.low_change = low_change
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.quota = quota
+        self.name = name
+        self._interval = self._bound(initial_seconds if initial_seconds is not None else min_seconds)
+        self._previous: Optional[List[Dict]] = None
+        self._lock = threading.Lock()
+
+    def _bound(self, seconds: float) -> float:
+        floor = self.min_seconds
+        if self.quota is not None:
+            try:
+                floor = max(floor, self.quota.sustainable_interval())
+            except Exception as e:
+                logger.error(f"Could not read quota for {self.name} cadence: {e}")
+        return min(self.max_seconds, max(floor, seconds))
+
+    @property
+    def interval(self) -> float:
+        """Seconds until the next refresh."""
+        return self._interval
+
+    def observe(self, data: List[Dict]) -> float:
+        """
+        Record the data from a refresh and return the next interval.
+
+        Args:
+            data: The freshly fetched list of {'symbol', 'ratio', ...} dicts
+
+        Returns:
+            Seconds to wait before the next refresh
+        """
+        with self._lock:
+            if self._previous is None:
+                score = None
+                interval = self._interval
+            else:
+                score = change_score(self._previous, data)
+                interval = self._interval
+                if score >= self.high_change:
+                    interval *= self.speedup
+                elif score <= self.low_change:
+                    interval *= self.slowdown
+            self._previous = data
+            self._interval = self._bound(interval)
+
+        if score is not None:
+            logger.info(f"{self.name} change score {score:.4f}, next refresh in {self._interval:.0f}s")
+        return self._interval
@@ -0,0 +1,214 @@
+"""
+Module for building the per-day history charts
+
+Chart building is CPU-bound (Plotly figure construction and JSON
+encoding), so when several days need building they are fanned out to a
+process pool. Built charts are cached by their content, so a day is only
+ever built once for a given set of bars.
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import plotly.express as px
+import plotly.utils as pu
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# (day, symbols, ratios) for one chart
+DayPayload = Tuple[str, List[str], List[float]]
+
+def build_day_chart(day: str, symbols: List[str], ratios: List[float]) -> str:
+    """
+    Build the bar chart for one day and return it as Plotly JSON.
+    Runs in pool workers, so it only takes plain lists.
+    """
+    top_symbols = pd.DataFrame({'symbol': symbols, 'ratio': ratios})
+
+    fig = px.bar(
+        top_symbols,
+        x='symbol',
+        y='ratio',
+        title=f'Cryptocurrencies with Borrow/Repay Ratio > 10 on {day}',
+        labels={'symbol': 'Cryptocurrency', 'ratio': 'Borrow/Repay Ratio'},
+        color='ratio',
+        color_continuous_scale='Viridis',
+        text='ratio'
+    )
+
+    # Update layout
+    fig.update_layout(
+        template='plotly_dark',
+        xaxis_title='Cryptocurrency',
+        yaxis_title='Borrow/Repay Ratio',
+        coloraxis_showscale=False,
+        height=400
+    )
+
+    # Format the text labels
+    fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
+
+    return pu.PlotlyJSONEncoder().encode(fig)
+
+class DayChartCache:
+    """Least-recently-used cache of built charts, keyed by their content."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._charts: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(payload: DayPayload) -> str:
+        return hashlib.sha1(json.dumps(payload).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            chart = self._charts.get(key)
+            if chart is not None:
+                self._charts.move_to_end(key)
+            return chart
+
+    def put(self, key: str, chart: str) -> None:
+        with self._lock:
+            self._charts[key] = chart
+            self._charts.move_to_end(key)
+            while len(self._charts) > self.maxsize:
+                self._charts.popitem(last=False)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_tasks = 0
+# Open leases per pool, so a retired pool is only shut down once unused
+_pool_leases: Dict[ProcessPoolExecutor, int] = {}
+_pool_lock = threading.Lock()
+
+def _shutdown_if_unused(pool: ProcessPoolExecutor) -> None:
+    """Shut down a retired pool that has no leases left. Call with _pool_lock held."""
+    if pool is not _pool and not _pool_leases.get(pool):
+        _pool_leases.pop(pool, None)
+        # Work already submitted to the pool still completes
+        pool.shutdown(wait=False)
+
+@contextmanager
+def lease_pool(max_workers: int, tasks_per_child: int) -> Iterator[ProcessPoolExecutor]:
+    """
+    Lease the shared chart pool, creating it on first use.
+
+    Workers are spawned rather than forked (the web process runs other
+    threads). Once the pool has built about `tasks_per_child` charts per
+    worker it is retired and replaced, which bounds how much memory a
+    worker can accumulate. (ProcessPoolExecutor's own max_tasks_per_child
+    can deadlock on Python 3.11.) A retired pool is shut down when its
+    last lease ends, so a request still holding it can keep submitting.
+    """
+    global _pool, _pool_tasks
+    with _pool_lock:
+        if _pool is not None and _pool_tasks >= tasks_per_child * max_workers:
+            retired, _pool = _pool, None
+            _shutdown_if_unused(retired)
+            logger.info("Recycled chart pool")
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_tasks = 0
+            logger.info(f"Started chart pool with {max_workers} workers")
+        pool = _pool
+        _pool_leases[pool] = _pool_leases.get(pool, 0) + 1
+
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_leases[pool] -= 1
+            _shutdown_if_unused(pool)
+
+def _count_tasks(pool: ProcessPoolExecutor, count: int) -> None:
+    global _pool_tasks
+    with _pool_lock:
+        if pool is _pool:
+            _pool_tasks += count
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next lease starts a new one"""
+    global _pool
+    with _pool_lock:
+        if pool is _pool:
+            _pool = None
+
+def _build_inline(payload: DayPayload) -> Optional[str]:
+    """Build one chart in this process, or return None if it fails"""
+    try:
+        return build_day_chart(*payload)
+    except Exception as e:
+        logger.error(f"Could not build chart for {payload[0]}: {e}")
+        return None
+
+def build_day_charts(payloads: List[DayPayload], cache: DayChartCache,
+                     pool: Optional[ProcessPoolExecutor] = None) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Yield (day, chart_json) for every payload, in order, as soon as each
+    chart is available. chart_json is None for a day whose chart could not
+    be built, so one bad day doesn't cut a streamed page short.
+
+    Cached charts are reused; the rest are built in the pool when more
+    than one is missing (a single chart isn't worth the round trip).
+
+    Args:
+        payloads: (day, symbols, ratios) for each chart
+        cache: Cache of previously built charts
+        pool: Optional process pool to build missing charts in, leased
+            with lease_pool for as long as the charts are being consumed
+    """
+    keys = [DayChartCache.key(payload) for payload in payloads]
+    charts = [cache.get(key) for key in keys]
+    missing = [payloads[i] for i, chart in enumerate(charts) if chart is None]
+
+    futures: Optional[List[Future]] = None
+    if pool is not None and len(missing) > 1:
+        futures = []
+        try:
+            for payload in missing:
+                futures.append(pool.submit(build_day_chart, *payload))
+            _count_tasks(pool, len(missing))
+        except (BrokenProcessPool, RuntimeError) as e:
+            # RuntimeError: the pool was shut down under us
+            logger.error(f"Chart pool unavailable, building charts inline: {e}")
+            _reset_pool(pool)
+            for future in futures:
+                future.cancel()
+            futures = None
+
+    done = 0
+    try:
+        for key, payload, chart in zip(keys, payloads, charts):
+            if chart is None:
+                if futures is None:
+                    chart = _build_inline(payload)
+                else:
+                    try:
+                        chart = futures[done].result()
+                    except BrokenProcessPool as e:
+                        logger.error(f"Chart pool failed, building remaining charts inline: {e}")
+                        _reset_pool(pool)
+                        futures = None
+                        chart = _build_inline(payload)
+                    except Exception as e:
+                        logger.error(f"Could not build chart for {payload[0]}: {e}")
+                done += 1
+                if chart is not None:
+                    cache.put(key, chart)
+            yield payload[0], chart
+    finally:
+        # Don't keep building charts nobody will read (e.g. the client left)
+        for future in futures or ():
+            future.cancel()
@@ -17,6 +17,43 @@ SUBSCRIBERS_FILE = 'subscribers.json'
 
 # Binance API settings
 BINANCE_API_BASE_URL = "https://www.binance.com/bapi/earn/v1/private/lending/margin/market"
+# How long a snapshot refresh waits for Binance margin data before going without it
+BINANCE_MARGIN_TIMEOUT_SECONDS = float(os.environ.get('BINANCE_MARGIN_TIMEOUT_SECONDS', 15))
+
+# Rankings show the top RANKING_SIZE symbols with a ratio above RANKING_MIN_RATIO
+RANKING_SIZE = int(os.environ.get('RANKING_SIZE', 20))
+RANKING_MIN_RATIO = float(os.environ.get('RANKING_MIN_RATIO', 10))
+
+# Telegram alerts: a rule re-arms once the ratio moves ALERT_HYSTERESIS
+# (as a fraction of the threshold) back past it, and fires at most once
+# per ALERT_COOLDOWN_SECONDS for the same symbol
+ALERT_HYSTERESIS = float(os.environ.get('ALERT_HYSTERESIS', 0.05))
+ALERT_COOLDOWN_SECONDS = int(os.environ.get('ALERT_COOLDOWN_SECONDS', 3600))
+MAX_ALERTS_PER_CHAT = int(os.environ.get('MAX_ALERTS_PER_CHAT', 20))
+
+# Personalized Telegram reports: top-N size and watchlist length limits,
+# and how many rendered reports (per snapshot and preferences) to keep
+MAX_REPORT_TOP_N = int(os.environ.get('MAX_REPORT_TOP_N', 20))
+MAX_WATCHLIST_SIZE = int(os.environ.get('MAX_WATCHLIST_SIZE', 20))
+REPORT_CACHE_SIZE = int(os.environ.get('REPORT_CACHE_SIZE', 256))
+
+# Daily reports go out in UTC slots of this many minutes; each chat's
+# local delivery time is mapped to the slot it falls in
+REPORT_SLOT_MINUTES = int(os.environ.get('REPORT_SLOT_MINUTES', 15))
+
+# Outbound Telegram messages share one queue limited to
+# OUTBOUND_RATE_PER_SECOND (Telegram allows about 30 per second overall)
+OUTBOUND_RATE_PER_SECOND = float(os.environ.get('OUTBOUND_RATE_PER_SECOND', 25))
+OUTBOUND_BURST = int(os.environ.get('OUTBOUND_BURST', 25))
+OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', 8))
+
+# Anomaly detection: a ratio ANOMALY_THRESHOLD_SIGMA standard deviations
+# above its ANOMALY_BASELINE_DAYS baseline is flagged, once a symbol has
+# ANOMALY_MIN_SAMPLES snapshots. Baselines are saved to ANOMALY_STATE_FILE.
+ANOMALY_BASELINE_DAYS = float(os.environ.get('ANOMALY_BASELINE_DAYS', 7))
+ANOMALY_THRESHOLD_SIGMA = float(os.environ.get('ANOMALY_THRESHOLD_SIGMA', 5))
+ANOMALY_MIN_SAMPLES = int(os.environ.get('ANOMALY_MIN_SAMPLES', 30))
+ANOMALY_STATE_FILE = os.environ.get('ANOMALY_STATE_FILE', 'anomaly_state.npz')
 
 # Scheduler settings
 DATA_UPDATE_INTERVAL_MINUTES = 10
@@ -24,6 +61,65 @@ DAILY_REPORT_HOUR = 10
 DAILY_REPORT_MINUTE = 0
 DAILY_REPORT_TIMEZONE = "UTC"
 
+# Snapshot settings
+# CoinGecko refreshes market data roughly once a minute, so a snapshot
+# stays fresh for that long before the next request triggers a refetch
+SNAPSHOT_TTL_SECONDS = int(os.environ.get('SNAPSHOT_TTL_SECONDS', 60))
+
+# History retention settings
+# Raw rows are rolled up into hourly aggregates after RAW_RETENTION_DAYS,
+# and hourly aggregates into daily ones after HOURLY_RETENTION_DAYS
+RAW_RETENTION_DAYS = int(os.environ.get('RAW_RETENTION_DAYS', 7))
+HOURLY_RETENTION_DAYS = int(os.environ.get('HOURLY_RETENTION_DAYS', 90))
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 5000))
+MAINTENANCE_INTERVAL_MINUTES = int(os.environ.get('MAINTENANCE_INTERVAL_MINUTES', 60))
+MAINTENANCE_JOBS_ENABLED = os.environ.get('MAINTENANCE_JOBS_ENABLED', '1') == '1'
+
+# Write-behind persistence of fetched data
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 100))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 10))
+
+# History chart building
+CHART_WORKERS = int(os.environ.get('CHART_WORKERS', min(4, os.cpu_count() or 1)))
+CHART_TASKS_PER_CHILD = int(os.environ.get('CHART_TASKS_PER_CHILD', 200))
+CHART_CACHE_SIZE = int(os.environ.get('CHART_CACHE_SIZE', 1024))
+
+# Parquet archive of closed days (requires pyarrow)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+# CoinGecko demo key budget, shared by the web app and the bots through
+# QUOTA_DB_PATH. QUOTA_RESERVE_FRACTION of each budget is kept for
+# scheduled refreshes; on-demand calls fall back to cached data instead.
+COINGECKO_CALLS_PER_MINUTE = int(os.environ.get('COINGECKO_CALLS_PER_MINUTE', 30))
+COINGECKO_MONTHLY_CALLS = int(os.environ.get('COINGECKO_MONTHLY_CALLS', 10000))
+QUOTA_RESERVE_FRACTION = float(os.environ.get('QUOTA_RESERVE_FRACTION', 0.2))
+QUOTA_DB_PATH = os.environ.get('QUOTA_DB_PATH', 'quota.sqlite3')
+
+# Real-data mode: funding rates, open interest and margin borrow rates
+# from several exchanges are merged per symbol and attached to each
+# snapshot row. Each exchange gets EXCHANGE_TIMEOUT_SECONDS per refresh.
+REAL_DATA_MODE = os.environ.get('REAL_DATA_MODE', '0') == '1'
+REAL_DATA_EXCHANGES = os.environ.get('REAL_DATA_EXCHANGES', 'binance,bybit,okx').split(',')
+EXCHANGE_TIMEOUT_SECONDS = float(os.environ.get('EXCHANGE_TIMEOUT_SECONDS', 10))
+EXCHANGE_DATA_TTL_SECONDS = int(os.environ.get('EXCHANGE_DATA_TTL_SECONDS', 300))
+
+# Adaptive refresh cadence. DATA_UPDATE_INTERVAL_MINUTES is the starting
+# interval; it is halved when the mean relative change between refreshes
+# reaches REFRESH_HIGH_CHANGE and stretched 1.5x when it stays below
+# REFRESH_LOW_CHANGE, within these bounds
+REFRESH_MIN_SECONDS = int(os.environ.get('REFRESH_MIN_SECONDS', 60))
+REFRESH_MAX_SECONDS = int(os.environ.get('REFRESH_MAX_SECONDS', 3600))
+REFRESH_HIGH_CHANGE = float(os.environ.get('REFRESH_HIGH_CHANGE', 0.05))
+REFRESH_LOW_CHANGE = float(os.environ.get('REFRESH_LOW_CHANGE', 0.005))
+
+# Live stream (/api/stream) connections per process. Without the gevent
+# worker every connection holds a worker thread, so only
+# STREAM_MAX_THREADED_CLIENTS are accepted; clients over the limit are
+# told to reconnect after STREAM_RETRY_SECONDS
+STREAM_MAX_CLIENTS = int(os.environ.get('STREAM_MAX_CLIENTS', 2000))
+STREAM_MAX_THREADED_CLIENTS = int(os.environ.get('STREAM_MAX_THREADED_CLIENTS', 4))
+STREAM_RETRY_SECONDS = int(os.environ.get('STREAM_RETRY_SECONDS', 30))
+
 # Initialize application settings
 def init_app():
     """Initialize application settings and check for required resources."""
@@ -0,0 +1,58 @@
+"""
+Module for downsampling time series before sending them to clients
+"""
+
+from typing import List, Sequence, Tuple
+
+Point = Tuple[float, float]
+
+def lttb(points: Sequence[Point], threshold: int) -> List[Point]:
+    """
+    Downsample a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    LTTB keeps the first and last points and, for every bucket in between,
+    the point forming the largest triangle with the previously kept point
+    and the average of the next bucket. Spikes survive, which plain
+    averaging would flatten.
+
+    Args:
+        points: (x, y) pairs sorted by x
+        threshold: Maximum number of points to return
+
+    Returns:
+        The downsampled points
+    """
+    length = len(points)
+    if threshold >= length or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (length - 2) / (threshold - 2)
+    a = 0  # Index of the previously selected point
+
+    for i in range(threshold - 2):
+        # Average of the next bucket, used as the third triangle vertex
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        next_count = next_end - next_start
+        avg_x = sum(p[0] for p in points[next_start:next_end]) / next_count
+        avg_y = sum(p[1] for p in points[next_start:next_end]) / next_count
+
+        # Pick the point of the current bucket with the largest triangle area
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[a]
+        best_area = -1.0
+        best_index = start
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best_index = j
+
+        sampled.append(points[best_index])
+        a = best_index
+
+    sampled.append(points[-1])
+    return sampled
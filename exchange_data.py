@@ -0,0 +1,164 @@
+"""
+Module for collecting funding, open interest and margin borrow data
+from several exchanges
+
+Each exchange is queried from its own thread using only CCXT bulk
+endpoints (one request per metric for every market), and the whole
+exchange is given a deadline: whatever has not answered by then is left
+out of this round instead of holding up the others. The per-exchange
+results are merged into one row per base symbol.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from statistics import mean
+from typing import Any, Dict, List, Optional, Tuple
+
+import ccxt
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Milliseconds per year, for annualizing borrow rates
+_YEAR_MS = 365 * 24 * 60 * 60 * 1000
+
+# One CCXT instance per exchange, so markets are loaded once rather than
+# on every refresh. Each has a lock: a call that missed its deadline may
+# still be running when the next refresh starts.
+_exchanges: Dict[str, Tuple[Any, threading.Lock]] = {}
+_exchanges_lock = threading.Lock()
+
+def get_exchange(exchange_id: str, timeout_seconds: float) -> Tuple[Any, threading.Lock]:
+    """Return the shared CCXT instance for an exchange and its lock."""
+    with _exchanges_lock:
+        if exchange_id not in _exchanges:
+            exchange = getattr(ccxt, exchange_id)({'enableRateLimit': True})
+            _exchanges[exchange_id] = (exchange, threading.Lock())
+        exchange, lock = _exchanges[exchange_id]
+    exchange.timeout = int(timeout_seconds * 1000)
+    return exchange, lock
+
+def _base(symbol: str) -> str:
+    return symbol.split('/')[0]
+
+def collect_exchange(exchange_id: str, timeout_seconds: float) -> Dict[str, Dict]:
+    """
+    Fetch funding rates, open interest and cross-margin borrow rates from
+    one exchange, using each bulk method the exchange supports.
+
+    Returns a dict of base symbol -> {'funding_rates': [...],
+    'open_interest': float or None, 'borrow_rate': float or None}.
+    A failing method is logged and skipped; the others still count.
+    Raises if the exchange is still busy with a previous refresh.
+    """
+    exchange, lock = get_exchange(exchange_id, timeout_seconds)
+    if not lock.acquire(timeout=timeout_seconds):
+        raise Exception(f"{exchange_id} is still busy with the previous refresh")
+    try:
+        return _collect(exchange, exchange_id)
+    finally:
+        lock.release()
+
+def _collect(exchange, exchange_id: str) -> Dict[str, Dict]:
+    rows: Dict[str, Dict] = {}
+
+    def row(base: str) -> Dict:
+        return rows.setdefault(base, {'funding_rates': [], 'open_interest': None, 'borrow_rate': None})
+
+    if exchange.has.get('fetchFundingRates'):
+        try:
+            for symbol, funding in exchange.fetch_funding_rates().items():
+                if funding.get('fundingRate') is not None:
+                    row(_base(symbol))['funding_rates'].append(funding['fundingRate'])
+        except Exception as e:
+            logger.warning(f"Could not fetch funding rates from {exchange_id}: {e}")
+
+    if exchange.has.get('fetchOpenInterests'):
+        try:
+            for symbol, interest in exchange.fetch_open_interests().items():
+                value = interest.get('openInterestValue')
+                if value is not None:
+                    entry = row(_base(symbol))
+                    entry['open_interest'] = (entry['open_interest'] or 0) + value
+        except Exception as e:
+            logger.warning(f"Could not fetch open interest from {exchange_id}: {e}")
+
+    if exchange.has.get('fetchCrossBorrowRates'):
+        try:
+            for currency, borrow in exchange.fetch_cross_borrow_rates().items():
+                if borrow.get('rate') is not None and borrow.get('period'):
+                    row(currency)['borrow_rate'] = borrow['rate'] * _YEAR_MS / borrow['period']
+        except Exception as e:
+            # Usually needs API credentials
+            logger.warning(f"Could not fetch borrow rates from {exchange_id}: {e}")
+
+    logger.info(f"Collected derivatives data for {len(rows)} symbols from {exchange_id}")
+    return rows
+
+def merge_exchange_rows(per_exchange: Dict[str, Dict[str, Dict]]) -> List[Dict]:
+    """
+    Merge per-exchange rows into one row per symbol.
+
+    Funding rates are averaged across exchanges, open interest (USD) is
+    summed, and the cheapest annualized borrow rate is kept.
+    """
+    merged: Dict[str, Dict] = {}
+    for exchange_id, rows in per_exchange.items():
+        for symbol, data in rows.items():
+            entry = merged.setdefault(symbol, {'funding_rates': [], 'open_interest': None,
+                                               'borrow_rates': [], 'exchanges': []})
+            entry['funding_rates'].extend(data['funding_rates'])
+            if data['open_interest'] is not None:
+                entry['open_interest'] = (entry['open_interest'] or 0) + data['open_interest']
+            if data['borrow_rate'] is not None:
+                entry['borrow_rates'].append(data['borrow_rate'])
+            entry['exchanges'].append(exchange_id)
+
+    return [{
+        'symbol': symbol,
+        'funding_rate': mean(entry['funding_rates']) if entry['funding_rates'] else None,
+        'open_interest': entry['open_interest'],
+        'borrow_rate': min(entry['borrow_rates']) if entry['borrow_rates'] else None,
+        'exchanges': sorted(entry['exchanges'])
+    } for symbol, entry in sorted(merged.items())]
+
+def fetch_exchange_data(exchange_ids: List[str], timeout_seconds: float = 10,
+                        executor: Optional[ThreadPoolExecutor] = None) -> List[Dict]:
+    """
+    Collect and merge data from all exchanges in parallel.
+
+    Args:
+        exchange_ids: CCXT exchange IDs
+        timeout_seconds: Deadline for each exchange; late ones are skipped
+        executor: Optional thread pool to run the exchanges in
+
+    Returns:
+        One dict per symbol with funding_rate, open_interest, borrow_rate
+        and the list of exchanges that reported it
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=len(exchange_ids), thread_name_prefix='exchange-data')
+
+    try:
+        futures = {executor.submit(collect_exchange, exchange_id, timeout_seconds): exchange_id
+                   for exchange_id in exchange_ids}
+        done, not_done = wait(futures, timeout=timeout_seconds)
+
+        per_exchange = {}
+        for future in done:
+            try:
+                per_exchange[futures[future]] = future.result()
+            except Exception as e:
+                logger.error(f"Error collecting data from {futures[future]}: {e}")
+        for future in not_done:
+            logger.warning(f"{futures[future]} missed the {timeout_seconds}s deadline, skipping it")
+    finally:
+        if own_executor:
+            # Don't wait for exchanges that missed the deadline
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if not per_exchange:
+        raise Exception("No exchange returned derivatives data")
+    return merge_exchange_rows(per_exchange)
@@ -1,5 +1,5 @@
 import logging
-from app import app
+from app import app, start_maintenance_jobs
 
 # Configure logging
 logging.basicConfig(
@@ -9,4 +9,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # This file is used by Replit to run the Flask application
-# The app is configured in app.py
\ No newline at end of file
+# The app is configured in app.py
+
+# Only the serving process runs history maintenance
+start_maintenance_jobs()
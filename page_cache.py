@@ -0,0 +1,52 @@
+"""
+Module for caching fully rendered pages
+"""
+
+import gzip
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class RenderedPageCache:
+    """
+    Rendered response bodies keyed by snapshot ID, each stored with a
+    precompressed gzip variant so a hit costs no rendering or compression.
+    """
+
+    def __init__(self, compresslevel: int = 6):
+        self.compresslevel = compresslevel
+        self._pages: Dict[Any, Dict[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Dict[str, bytes]]:
+        """Return the cached variants for a key, or None on a miss."""
+        return self._pages.get(key)
+
+    def put(self, key: Any, body: bytes) -> Dict[str, bytes]:
+        """
+        Store a rendered body together with its compressed variants.
+
+        Args:
+            key: Cache key, usually the snapshot ID
+            body: The rendered, encoded response body
+
+        Returns:
+            A dict mapping content encodings ('identity', 'gzip') to bytes
+        """
+        variants = {
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=self.compresslevel)
+        }
+        with self._lock:
+            self._pages[key] = variants
+        return variants
+
+    def clear(self, *args: Any) -> None:
+        """Drop every cached page. Accepts and ignores listener arguments."""
+        with self._lock:
+            if self._pages:
+                logger.debug(f"Invalidating {len(self._pages)} cached pages")
+            self._pages = {}
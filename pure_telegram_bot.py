@@ -9,6 +9,8 @@ import logging
 import requests
 from datetime import datetime
 
+from ranking import top_k
+
 try:
     from telegram import Update
     from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, CallbackContext
@@ -121,10 +123,10 @@ def fetch_margin_data():
         filtered_data = [item for item in data if item.get('ratio', 0) > 10]
         # Use filtered data if available, otherwise use all data
         if filtered_data:
-            top = sorted(filtered_data, key=lambda x: x.get('ratio', 0), reverse=True)[:10]
+            top = top_k(filtered_data, 10)
         else:
             # If no items with ratio > 10, use the top 10 by ratio
-            top = sorted(data, key=lambda x: x.get('ratio', 0), reverse=True)[:10]
+            top = top_k(data, 10)
         
         # Save data to cache file for backup
         with open(DATA_CACHE_FILE, 'w') as f:
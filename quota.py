@@ -0,0 +1,205 @@
+"""
+Module for sharing an upstream API quota between processes
+
+The web app and the bots all spend the same CoinGecko demo key, so the
+budget is kept in a small SQLite database that every process updates
+inside an immediate transaction. Each key has a token bucket for the
+per-minute limit and a counter for the calendar month (UTC).
+
+Part of both budgets is reserved for scheduled refreshes: on-demand
+calls are refused once only the reserve is left, so user traffic makes
+callers fall back to cached data before the key itself gets throttled.
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config import (
+    COINGECKO_CALLS_PER_MINUTE,
+    COINGECKO_MONTHLY_CALLS,
+    QUOTA_RESERVE_FRACTION,
+    QUOTA_DB_PATH,
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Call priorities
+SCHEDULED = 'scheduled'
+ON_DEMAND = 'on_demand'
+
+class QuotaExhausted(Exception):
+    """Raised when a call would exceed the remaining budget for its priority"""
+
+def _month(now: float) -> str:
+    return datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m')
+
+class QuotaBudget:
+    """
+    Per-minute token bucket and monthly call budget for one API key,
+    shared by every process that opens the same database file.
+    """
+
+    def __init__(self, path: str, name: str, per_minute: int, monthly: int,
+                 reserve_fraction: float = 0.2):
+        self.path = path
+        self.name = name
+        self.per_minute = per_minute
+        self.monthly = monthly
+        # Tokens/calls that only scheduled refreshes may spend
+        self.minute_reserve = math.ceil(per_minute * reserve_fraction)
+        self.monthly_reserve = math.ceil(monthly * reserve_fraction)
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        if not self._initialized:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS quota (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    month TEXT NOT NULL,
+                    month_used INTEGER NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._initialized = True
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, now: float) -> Dict:
+        row = conn.execute(
+            "SELECT tokens, updated, month, month_used, blocked_until FROM quota WHERE name = ?",
+            (self.name,)
+        ).fetchone()
+        if row is None:
+            return {'tokens': float(self.per_minute), 'month': _month(now),
+                    'month_used': 0, 'blocked_until': 0.0}
+
+        tokens, updated, month, month_used, blocked_until = row
+        # Refill the bucket for the time since the last update
+        tokens = min(float(self.per_minute), tokens + max(0.0, now - updated) * self.per_minute / 60.0)
+        if month != _month(now):
+            month, month_used = _month(now), 0
+        return {'tokens': tokens, 'month': month, 'month_used': month_used,
+                'blocked_until': blocked_until}
+
+    def _store(self, conn: sqlite3.Connection, state: Dict, now: float) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO quota (name, tokens, updated, month, month_used, blocked_until) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (self.name, state['tokens'], now, state['month'], state['month_used'], state['blocked_until'])
+        )
+
+    def acquire(self, priority: str = ON_DEMAND) -> bool:
+        """
+        Spend one call from the budget if the priority allows it.
+
+        Args:
+            priority: SCHEDULED or ON_DEMAND
+
+        Returns:
+            True if the call may go ahead, False if the caller should use
+            cached data instead
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            # Take the write lock up front so processes can't interleave
+            conn.execute("BEGIN IMMEDIATE")
+            state = self._load(conn, now)
+
+            reserved = priority != SCHEDULED
+            minute_floor = 1 + (self.minute_reserve if reserved else 0)
+            monthly_limit = self.monthly - (self.monthly_reserve if reserved else 0)
+            allowed = (now >= state['blocked_until'] and
+                       state['tokens'] >= minute_floor and
+                       state['month_used'] < monthly_limit)
+
+            if allowed:
+                state['tokens'] -= 1
+                state['month_used'] += 1
+            self._store(conn, state, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        if not allowed:
+            logger.warning(f"{self.name} quota refused a {priority} call "
+                           f"({state['tokens']:.1f} tokens, {state['month_used']} used this month)")
+        return allowed
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        """
+        Record that upstream throttled us: empty the bucket and block all
+        calls for `retry_after` seconds (a full minute if unknown).
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = self._load(conn, now)
+            state['tokens'] = 0.0
+            state['blocked_until'] = now + (retry_after if retry_after is not None else 60)
+            self._store(conn, state, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        logger.warning(f"{self.name} throttled upstream, blocking calls until {state['blocked_until']:.0f}")
+
+    def sustainable_interval(self) -> float:
+        """
+        Seconds between calls at which the rest of this month's budget
+        lasts until the month ends.
+        """
+        now = datetime.now(timezone.utc)
+        if now.month == 12:
+            month_end = now.replace(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        else:
+            month_end = now.replace(month=now.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        calls_left = self.monthly - self.status()['month_used']
+        return (month_end - now).total_seconds() / max(calls_left, 1)
+
+    def status(self) -> Dict:
+        """Return the current budget without spending anything."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            state = self._load(conn, now)
+        finally:
+            conn.close()
+        return {
+            'tokens': round(state['tokens'], 2),
+            'per_minute': self.per_minute,
+            'month_used': state['month_used'],
+            'monthly': self.monthly,
+            'blocked_for': max(0.0, round(state['blocked_until'] - now, 1))
+        }
+
+def coingecko_budget() -> QuotaBudget:
+    """Return the shared budget for the CoinGecko demo key, as configured."""
+    return QuotaBudget(QUOTA_DB_PATH, 'coingecko',
+                       per_minute=COINGECKO_CALLS_PER_MINUTE,
+                       monthly=COINGECKO_MONTHLY_CALLS,
+                       reserve_fraction=QUOTA_RESERVE_FRACTION)
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds, if present."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,153 @@
+"""
+Module for ranking symbols by a value without fully sorting them
+
+top_k() picks the K largest rows of a list in O(n log K). TopKRanking
+keeps a top-K over a threshold up to date as individual symbols change,
+so a refresh that only touches a few symbols doesn't rebuild the ranking.
+"""
+
+import heapq
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+def _value_getter(key: str) -> Callable[[Dict], float]:
+    return lambda row: row.get(key, 0) or 0
+
+def top_k(rows: Iterable[Dict], k: int, key: str = 'ratio',
+          threshold: Optional[float] = None) -> List[Dict]:
+    """
+    Return the k rows with the largest `key`, largest first.
+
+    Args:
+        rows: Rows to rank
+        k: Number of rows to return
+        key: Field to rank by
+        threshold: If given, only rows whose value is above it are ranked
+
+    Returns:
+        At most k rows; ties keep their input order, like sorted()
+    """
+    value = _value_getter(key)
+    if threshold is not None:
+        rows = (row for row in rows if value(row) > threshold)
+    return heapq.nlargest(k, rows, key=value)
+
+class TopKRanking:
+    """
+    Incrementally maintained top-K of rows whose value exceeds a threshold.
+
+    Rows above the threshold are split between a min-heap holding the
+    current top K and a max-heap holding the rest. An update pushes one
+    heap entry and moves at most a few entries across, so it costs
+    O(log n); superseded entries are left in place and skipped when they
+    reach the top of their heap. Reading the ranking is O(K) once it has
+    been sorted after the last change.
+    """
+
+    def __init__(self, k: int = 20, threshold: float = 10, key: str = 'ratio'):
+        self.k = k
+        self.threshold = threshold
+        self.key = key
+        self._value = _value_getter(key)
+        # symbol -> (version, row) for every row above the threshold
+        self._rows: Dict[str, Tuple[int, Dict]] = {}
+        self._in_top: set = set()
+        # Heap entries are (sort value, version, symbol)
+        self._top: List[Tuple[float, int, str]] = []
+        self._rest: List[Tuple[float, int, str]] = []
+        self._version = 0
+        self._sorted: Optional[List[Dict]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        """Number of symbols above the threshold."""
+        return len(self._rows)
+
+    def update(self, symbol: str, row: Optional[Dict]) -> None:
+        """
+        Set (or, with row=None, remove) one symbol's row.
+
+        Args:
+            symbol: The symbol being updated
+            row: Its new row, or None to drop it from the ranking
+        """
+        with self._lock:
+            self._version += 1
+            self._in_top.discard(symbol)
+
+            if row is None or self._value(row) <= self.threshold:
+                self._rows.pop(symbol, None)
+            else:
+                self._rows[symbol] = (self._version, row)
+                heapq.heappush(self._rest, (-self._value(row), self._version, symbol))
+
+            self._rebalance()
+            self._sorted = None
+
+    def remove(self, symbol: str) -> None:
+        """Drop a symbol from the ranking."""
+        self.update(symbol, None)
+
+    def replace_all(self, rows: Iterable[Dict], symbol_key: str = 'symbol') -> None:
+        """
+        Make the ranking reflect a full set of rows, touching only the
+        symbols that were added, changed or removed.
+        """
+        with self._lock:
+            incoming = {row[symbol_key]: row for row in rows}
+            for symbol in list(self._rows):
+                if symbol not in incoming:
+                    self.update(symbol, None)
+            for symbol, row in incoming.items():
+                current = self._rows.get(symbol)
+                if current is None or current[1] != row:
+                    self.update(symbol, row)
+
+    def top(self) -> List[Dict]:
+        """Return the top rows, largest value first."""
+        with self._lock:
+            if self._sorted is None:
+                members = [self._rows[symbol] for symbol in self._in_top]
+                # Ties go to the row updated first, like a stable sort
+                members.sort(key=lambda entry: (-self._value(entry[1]), entry[0]))
+                self._sorted = [row for _, row in members]
+            return list(self._sorted)
+
+    def _is_live(self, entry: Tuple[float, int, str], in_top: bool) -> bool:
+        current = self._rows.get(entry[2])
+        return (current is not None and current[0] == entry[1] and
+                (entry[2] in self._in_top) == in_top)
+
+    def _clean(self, heap: List[Tuple[float, int, str]], in_top: bool) -> None:
+        while heap and not self._is_live(heap[0], in_top):
+            heapq.heappop(heap)
+
+    def _rebalance(self) -> None:
+        self._clean(self._top, True)
+        self._clean(self._rest, False)
+
+        # Fill the top up to K from the best of the rest
+        while len(self._in_top) < self.k and self._rest:
+            value, version, symbol = heapq.heappop(self._rest)
+            self._in_top.add(symbol)
+            heapq.heappush(self._top, (-value, version, symbol))
+            self._clean(self._rest, False)
+
+        # Swap while the best of the rest beats the worst of the top
+        self._clean(self._top, True)
+        while self._rest and self._top and -self._rest[0][0] > self._top[0][0]:
+            value, version, symbol = heapq.heappop(self._rest)
+            _, top_version, top_symbol = heapq.heappop(self._top)
+            self._in_top.discard(top_symbol)
+            self._in_top.add(symbol)
+            heapq.heappush(self._top, (-value, version, symbol))
+            heapq.heappush(self._rest, (-self._value(self._rows[top_symbol][1]), top_version, top_symbol))
+            self._clean(self._top, True)
+            self._clean(self._rest, False)
+
+        # Superseded entries pile up under steady updates; compact now and then
+        if len(self._top) + len(self._rest) > 4 * len(self._rows) + 64:
+            self._top = [entry for entry in self._top if self._is_live(entry, True)]
+            self._rest = [entry for entry in self._rest if self._is_live(entry, False)]
+            heapq.heapify(self._top)
+            heapq.heapify(self._rest)
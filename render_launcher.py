@@ -4,6 +4,7 @@ Launcher script for Render.com deployment
 This runs both the Flask web application and Telegram bot concurrently
 """
 import os
+import importlib.util
 import logging
 import subprocess
 import sys
@@ -26,6 +27,18 @@ if not os.environ.get("PORT"):
     logger.warning("PORT environment variable not set, using default 5000")
     os.environ["PORT"] = "5000"
 
+def gunicorn_worker_args():
+    """
+    Choose the gunicorn worker model.
+    The gevent worker keeps each /api/stream connection on a greenlet, so
+    thousands of idle dashboards don't each pin one of a few threads.
+    """
+    if importlib.util.find_spec("gevent"):
+        return ["--worker-class", "gevent", "--worker-connections", "2000"]
+    logger.warning("gevent not installed, live stream connections will occupy worker threads "
+                   "and are capped at STREAM_MAX_THREADED_CLIENTS")
+    return ["--threads", "8"]
+
 def run_flask_app():
     """Run the Flask web application using gunicorn"""
     port = os.environ.get("PORT", "5000")
@@ -37,7 +50,7 @@ def run_flask_app():
             "gunicorn", 
             "--bind", f"0.0.0.0:{port}", 
             "--workers", "1",
-            "--threads", "8",
+            *gunicorn_worker_args(),
             "--timeout", "120",
             "main:app"
         ], check=True)
@@ -33,6 +33,9 @@ def run_telegram_bot():
     import requests
     import time
     from datetime import datetime
+
+    import quota
+    from ranking import top_k
     
     try:
         from telegram import Update
@@ -55,6 +58,9 @@ def run_telegram_bot():
     SUBSCRIBERS_FILE = 'telegram_subscribers.json'
     DATA_CACHE_FILE = 'telegram_crypto_data.json'
 
+    # CoinGecko key budget, shared with the web app
+    coingecko_quota = quota.coingecko_budget()
+
     # Cached data
     cached_data = "Data not loaded yet."
 
@@ -99,10 +105,12 @@ def run_telegram_bot():
         ]
         return sample_data
 
-    def fetch_margin_data():
+    def fetch_margin_data(priority=quota.ON_DEMAND):
         """
         Fetches cryptocurrency leverage indicator data from web app API or directly from CoinGecko
         Returns the top 10 cryptocurrencies by leverage indicator
+        Only scheduled refreshes (priority=quota.SCHEDULED) may spend the
+        CoinGecko quota's reserve
         """
         try:
             # Try the web app's API endpoint first for data sharing
@@ -126,7 +134,10 @@ def run_telegram_bot():
             except Exception as e:
                 logger.warning(f"Could not fetch data from web app: {e}")
             
-            # Try CoinGecko API directly
+            # Try CoinGecko API directly, unless the shared key budget is spent
+            # (the cache file below is used instead)
+            if not coingecko_quota.acquire(priority):
+                raise quota.QuotaExhausted("CoinGecko quota exhausted")
             logger.info("Trying to fetch data from CoinGecko API")
             url = "https://api.coingecko.com/api/v3/coins/markets"
             params = {
@@ -145,6 +156,8 @@ def run_telegram_bot():
             }
             
             response = requests.get(url, params=params, headers=headers, timeout=10)
+            if response.status_code == 429:
+                coingecko_quota.penalize(quota.retry_after_seconds(response.headers.get('Retry-After')))
             if response.status_code != 200:
                 logger.warning(f"CoinGecko API error: {response.status_code}")
                 # If CoinGecko API fails, use sample data
@@ -184,10 +197,10 @@ def run_telegram_bot():
             filtered_data = [item for item in result if item.get('ratio', 0) > 10]
             # Use filtered data if available, otherwise use all data
             if filtered_data:
-                top = sorted(filtered_data, key=lambda x: x.get('ratio', 0), reverse=True)[:10]
+                top = top_k(filtered_data, 10)
             else:
                 # If no items with ratio > 10, use the top 10 by ratio
-                top = sorted(result, key=lambda x: x.get('ratio', 0), reverse=True)[:10]
+                top = top_k(result, 10)
             
             # Save data to cache file for backup
             with open(DATA_CACHE_FILE, 'w') as f:
@@ -232,12 +245,12 @@ def run_telegram_bot():
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M UTC")
         return f"<pre>{output}\n\nUpdated: {timestamp}</pre>"
 
-    def update_cached_data():
+    def update_cached_data(priority=quota.ON_DEMAND):
         """Update the global cached data"""
         global cached_data
         logger.info("Updating data from sources...")
         try:
-            data = fetch_margin_data()
+            data = fetch_margin_data(priority)
             cached_data = format_data_for_telegram(data)
         except Exception as e:
             logger.error(f"Error updating data: {e}")
@@ -293,7 +306,7 @@ def run_telegram_bot():
     scheduler = BackgroundScheduler()
 
     # Update data every 10 minutes
-    scheduler.add_job(update_cached_data, 'interval', minutes=10)
+    scheduler.add_job(update_cached_data, 'interval', minutes=10, args=[quota.SCHEDULED])
 
     # Send daily report at 10:00 UTC
     scheduler.add_job(
@@ -0,0 +1,272 @@
+"""
+Module for sending outbound bot messages through one prioritized queue
+
+Interactive replies, alerts and bulk reports all go through the same
+queue and the same global rate limiter, so a broadcast to thousands of
+chats can't hold up a /margin reply: the reply jumps ahead of the
+queued reports. Messages to one chat are still delivered in the order
+they were queued, whatever their priority.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+ALERT = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", ALERT: "alert", BULK: "bulk"}
+
+# Wait times kept per priority for the metrics
+_WAIT_SAMPLES = 1000
+
+class _Message:
+    __slots__ = ("send", "args", "kwargs", "priority", "sequence", "future", "queued_at", "attempts")
+
+    def __init__(self, send, args, kwargs, priority, sequence, future, queued_at):
+        self.send = send
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+        self.queued_at = queued_at
+        self.attempts = 0
+
+class OutboundQueue:
+    """
+    Prioritized, rate-limited outbound message queue.
+
+    Each chat has a FIFO of pending messages and sits on a heap at the
+    priority of its head message. Popping a chat sends the head of its
+    FIFO, so messages to one chat never overtake each other. An urgent
+    message with at most `max_promotion` messages ahead of it lifts its
+    chat to its own priority, pulling those few forward with it; one
+    stuck behind a longer backlog waits for the backlog to shrink, so a
+    single reply can't move a whole broadcast ahead of other chats'
+    replies. A chat has at most one message in flight and is off the
+    heap until it completes; stale heap entries are skipped.
+
+    `retry_after(exception)` returns how long to pause before retrying a
+    failed send (e.g. Telegram's flood control), or None to give up on it;
+    a pause applies to the whole queue.
+    """
+
+    def __init__(self, rate_per_second: float = 25, burst: int = 25, workers: int = 8,
+                 max_retries: int = 3, max_promotion: int = 2,
+                 retry_after: Optional[Callable[[Exception], Optional[float]]] = None,
+                 name: str = "outbound"):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_promotion = max_promotion
+        self.retry_after = retry_after or (lambda e: None)
+        self.name = name
+        self._chats: Dict[Any, Deque[_Message]] = {}
+        # Heap entries are (priority, sequence of the chat's head, version, chat)
+        self._heap: List[Tuple[int, int, int, Any]] = []
+        self._sequence = itertools.count()
+        # chat -> (priority, version) of its live heap entry
+        self._scheduled: Dict[Any, Tuple[int, int]] = {}
+        self._version = itertools.count()
+        self._in_flight: Set[Any] = set()
+        self._ready: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        self._tokens = float(burst)
+        self._updated = 0.0
+        self._paused_until = 0.0
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._waits = {priority: deque(maxlen=_WAIT_SAMPLES) for priority in PRIORITY_NAMES}
+        self._max_wait = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+
+    async def start(self) -> None:
+        """Start the sender tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._ready = asyncio.Condition()
+        self._updated = asyncio.get_running_loop().time()
+        self._tasks = [asyncio.create_task(self._run(), name=f"{self.name}-{n}") for n in range(self.workers)]
+        logger.info(f"Started {self.name} queue with {self.workers} senders at {self.rate_per_second}/s")
+
+    async def stop(self) -> None:
+        """Stop sending. Messages still queued are cancelled."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for messages in self._chats.values():
+            for message in messages:
+                message.future.cancel()
+        self._chats.clear()
+        self._heap.clear()
+        self._scheduled.clear()
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        logger.info(f"Stopped {self.name} queue")
+
+    def submit(self, priority: int, chat_id: Any, send: Callable[..., Awaitable], /,
+               *args, **kwargs) -> asyncio.Future:
+        """
+        Queue a send. Must be called from the event loop the queue runs on;
+        other threads should hand their coroutine to that loop first (e.g.
+        with asyncio.run_coroutine_threadsafe).
+
+        Args:
+            priority: INTERACTIVE, ALERT or BULK
+            chat_id: Chat the message goes to; orders messages per chat
+            send: Coroutine function that sends the message
+            *args, **kwargs: Passed to `send` (so `chat_id=` can be passed on too)
+
+        Returns:
+            A future with the result of `send`, or the exception it raised
+        """
+        if priority not in PRIORITY_NAMES:
+            raise ValueError(f"Unknown priority: {priority}")
+        loop = asyncio.get_running_loop()
+        message = _Message(send, args, kwargs, priority, next(self._sequence), loop.create_future(), loop.time())
+        self._chats.setdefault(chat_id, deque()).append(message)
+        self._depth[priority] += 1
+        scheduled = self._scheduled.get(chat_id)
+        if chat_id not in self._in_flight and (scheduled is None or
+                                               self._chat_priority(chat_id) < scheduled[0]):
+            self._schedule(chat_id)
+        if self._ready is not None:
+            loop.create_task(self._notify())
+        return message.future
+
+    async def send(self, priority: int, chat_id: Any, send: Callable[..., Awaitable], /,
+                   *args, **kwargs) -> Any:
+        """Queue a send and wait until it has been delivered."""
+        return await self.submit(priority, chat_id, send, *args, **kwargs)
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting to be sent."""
+        return sum(self._depth.values())
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, wait times (seconds from queueing to sending) and counters."""
+        waits = {}
+        for priority, name in PRIORITY_NAMES.items():
+            samples = sorted(self._waits[priority])
+            waits[name] = {
+                "count": len(samples),
+                "avg": round(sum(samples) / len(samples), 3) if samples else 0.0,
+                "p95": round(samples[int(len(samples) * 0.95)], 3) if samples else 0.0,
+                "max": round(self._max_wait[priority], 3)
+            }
+        return {
+            "depth": {name: self._depth[priority] for priority, name in PRIORITY_NAMES.items()},
+            "in_flight": len(self._in_flight),
+            "wait_seconds": waits,
+            "sent": self._sent,
+            "failed": self._failed,
+            "retried": self._retried
+        }
+
+    async def _notify(self) -> None:
+        async with self._ready:
+            self._ready.notify()
+
+    async def _acquire(self) -> None:
+        """Wait for a token from the global rate limiter."""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+    def _chat_priority(self, chat_id: Any) -> int:
+        """Most urgent priority among a chat's head message and the few behind it."""
+        window = itertools.islice(self._chats[chat_id], self.max_promotion + 1)
+        return min(message.priority for message in window)
+
+    def _schedule(self, chat_id: Any) -> None:
+        """Put a chat on the heap at its current priority."""
+        messages = self._chats[chat_id]
+        priority = self._chat_priority(chat_id)
+        version = next(self._version)
+        self._scheduled[chat_id] = (priority, version)
+        heapq.heappush(self._heap, (priority, messages[0].sequence, version, chat_id))
+
+    def _pop(self) -> Optional[Tuple[Any, _Message]]:
+        """Take the head message of the most urgent chat."""
+        while self._heap:
+            priority, _, version, chat_id = heapq.heappop(self._heap)
+            if self._scheduled.get(chat_id) != (priority, version):
+                continue
+            del self._scheduled[chat_id]
+            message = self._chats[chat_id].popleft()
+            self._depth[message.priority] -= 1
+            self._in_flight.add(chat_id)
+            return chat_id, message
+        return None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(lambda: bool(self._scheduled))
+            # Take a token before picking the message, so a message queued
+            # while we wait for the rate limiter can still go first
+            await self._acquire()
+            async with self._ready:
+                popped = self._pop()
+            if popped is None:
+                self._tokens = min(self.burst, self._tokens + 1)
+                continue
+
+            chat_id, message = popped
+            wait = loop.time() - message.queued_at
+            self._waits[message.priority].append(wait)
+            self._max_wait[message.priority] = max(self._max_wait[message.priority], wait)
+            retry = False
+            try:
+                result = await message.send(*message.args, **message.kwargs)
+            except asyncio.CancelledError:
+                message.future.cancel()
+                raise
+            except Exception as e:
+                delay = self.retry_after(e)
+                if delay is not None and message.attempts < self.max_retries:
+                    message.attempts += 1
+                    self._retried += 1
+                    self._paused_until = max(self._paused_until, loop.time() + delay)
+                    logger.warning(f"{self.name} send to {chat_id} rate limited, retrying in {delay}s")
+                    retry = True
+                else:
+                    self._failed += 1
+                    if not message.future.done():
+                        message.future.set_exception(e)
+            else:
+                self._sent += 1
+                if not message.future.done():
+                    message.future.set_result(result)
+            finally:
+                async with self._ready:
+                    self._in_flight.discard(chat_id)
+                    if retry:
+                        # Back to the head of its chat, keeping the chat's order
+                        self._chats[chat_id].appendleft(message)
+                        self._depth[message.priority] += 1
+                    if self._chats[chat_id]:
+                        self._schedule(chat_id)
+                        self._ready.notify()
+                    else:
+                        del self._chats[chat_id]
@@ -0,0 +1,77 @@
+"""
+Module for collapsing concurrent duplicate calls into one
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """One in-flight execution and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+
+    Callers that arrive while a call for the same key is in flight wait for
+    it and share its result (or its exception) instead of starting their
+    own. Nothing is cached: the next caller after completion runs again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats: Dict[Hashable, Dict[str, int]] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call fn(*args, **kwargs), or wait for the in-flight call for `key`.
+
+        Args:
+            key: Identifies calls that may share a result
+            fn: The function to call
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        with self._lock:
+            stats = self._stats.setdefault(key, {'calls': 0, 'executions': 0, 'collapsed': 0})
+            stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                stats['executions'] += 1
+            else:
+                stats['collapsed'] += 1
+
+        if not leader:
+            logger.debug(f"Joining in-flight call for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Return call, execution and collapsed-call counts per key."""
+        with self._lock:
+            return {str(key): dict(stats) for key, stats in self._stats.items()}
@@ -0,0 +1,179 @@
+"""
+Module for tracking the published crypto data snapshot
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Currently published snapshot
+_lock = threading.Lock()
+_current: Optional[Dict[str, Any]] = None
+_last_id = 0
+
+# Ring of diffs between consecutive snapshots, oldest first
+DIFF_HISTORY_SIZE = 64
+_diffs = deque(maxlen=DIFF_HISTORY_SIZE)
+
+# Callbacks notified whenever a new snapshot is published
+_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+def add_listener(callback: Callable[[Dict[str, Any]], None]) -> None:
+    """Register a callback to be called with every newly published snapshot."""
+    _listeners.append(callback)
+
+def _next_snapshot_id(timestamp: datetime) -> int:
+    """
+    Return a new monotonic snapshot ID.
+    IDs are millisecond timestamps, bumped if the clock has not moved,
+    so they stay increasing across process restarts.
+    """
+    global _last_id
+    candidate = int((timestamp - datetime(1970, 1, 1)).total_seconds() * 1000)
+    _last_id = max(candidate, _last_id + 1)
+    return _last_id
+
+def content_hash(data: List[Dict]) -> str:
+    """
+    Hash the market values of a snapshot's rows, including the optional
+    Binance margin totals and the exchange metrics added in real-data mode.
+    Display-only fields (names, formatted amounts) are left out.
+    """
+    canonical = [
+        (row['symbol'], row['borrow_amount'], row['repay_amount'], row['ratio'],
+         row.get('margin_borrowed'), row.get('margin_repaid'),
+         row.get('funding_rate'), row.get('open_interest'), row.get('borrow_rate'))
+        for row in data
+    ]
+    return hashlib.sha1(json.dumps(canonical, default=str).encode('utf-8')).hexdigest()
+
+def publish_snapshot(data: List[Dict], ttl_seconds: int) -> Dict[str, Any]:
+    """
+    Publish a new snapshot of crypto data.
+
+    If the data is identical to the current snapshot, the current snapshot
+    is kept (same ID, so ETags stay valid) and only its freshness window is
+    extended; listeners are not notified.
+
+    Args:
+        data: The rows making up the snapshot
+        ttl_seconds: How long the snapshot is considered fresh
+
+    Returns:
+        The published snapshot
+    """
+    global _current
+    timestamp = datetime.utcnow()
+    digest = content_hash(data)
+
+    with _lock:
+        if _current is not None and _current['hash'] == digest:
+            _current = dict(_current, expires_at=timestamp + timedelta(seconds=ttl_seconds))
+            logger.info(f"Snapshot {_current['id']} unchanged, still valid at {timestamp.isoformat()}")
+            return _current
+
+        snapshot = {
+            'id': _next_snapshot_id(timestamp),
+            'timestamp': timestamp,
+            'expires_at': timestamp + timedelta(seconds=ttl_seconds),
+            'hash': digest,
+            'data': data
+        }
+        if _current is not None:
+            _diffs.append(_diff_rows(_current['id'], snapshot['id'], _current['data'], data))
+        _current = snapshot
+
+    logger.info(f"Published snapshot {snapshot['id']} with {len(data)} rows")
+
+    for callback in _listeners:
+        try:
+            callback(snapshot)
+        except Exception as e:
+            logger.error(f"Snapshot listener failed: {e}")
+
+    return snapshot
+
+def get_snapshot() -> Optional[Dict[str, Any]]:
+    """Return the currently published snapshot, or None if there is none yet."""
+    return _current
+
+def is_fresh(snapshot: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> bool:
+    """Check whether a snapshot is still within its freshness window."""
+    if snapshot is None:
+        return False
+    now = now or datetime.utcnow()
+    return now < snapshot['expires_at']
+
+def remaining_freshness(snapshot: Dict[str, Any], now: Optional[datetime] = None) -> int:
+    """Return the number of whole seconds the snapshot stays fresh."""
+    now = now or datetime.utcnow()
+    return max(0, int((snapshot['expires_at'] - now).total_seconds()))
+
+def _diff_rows(base_id: int, snapshot_id: int, old_rows: List[Dict], new_rows: List[Dict]) -> Dict[str, Any]:
+    """Compute the per-symbol difference between two consecutive snapshots."""
+    old_by_symbol = {row['symbol']: row for row in old_rows}
+    new_by_symbol = {row['symbol']: row for row in new_rows}
+
+    return {
+        'base_id': base_id,
+        'id': snapshot_id,
+        'inserted': {s: row for s, row in new_by_symbol.items() if s not in old_by_symbol},
+        'updated': {s: row for s, row in new_by_symbol.items()
+                    if s in old_by_symbol and old_by_symbol[s] != row},
+        'removed': [s for s in old_by_symbol if s not in new_by_symbol]
+    }
+
+def get_delta(since_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Return the changes between snapshot `since_id` and the current snapshot.
+
+    The diffs recorded after `since_id` are folded together; whether a
+    symbol was in the base snapshot is decided by the first diff touching it.
+
+    Args:
+        since_id: The snapshot ID the client already has
+
+    Returns:
+        A dict with inserted and updated rows and removed symbols, or None
+        if the base snapshot is no longer in the diff ring
+    """
+    with _lock:
+        current = _current
+        diffs = list(_diffs)
+
+    if current is None:
+        return None
+    if since_id == current['id']:
+        return {'base_id': since_id, 'id': current['id'], 'inserted': [], 'updated': [], 'removed': []}
+
+    start = next((i for i, diff in enumerate(diffs) if diff['base_id'] == since_id), None)
+    if start is None:
+        return None
+
+    in_base: Dict[str, bool] = {}
+    latest: Dict[str, Optional[Dict]] = {}
+    for diff in diffs[start:]:
+        for symbol, row in diff['inserted'].items():
+            in_base.setdefault(symbol, False)
+            latest[symbol] = row
+        for symbol, row in diff['updated'].items():
+            in_base.setdefault(symbol, True)
+            latest[symbol] = row
+        for symbol in diff['removed']:
+            in_base.setdefault(symbol, True)
+            latest[symbol] = None
+
+    return {
+        'base_id': since_id,
+        'id': current['id'],
+        'inserted': [row for s, row in latest.items() if row is not None and not in_base[s]],
+        'updated': [row for s, row in latest.items() if row is not None and in_base[s]],
+        'removed': [s for s, row in latest.items() if row is None and in_base[s]]
+    }
@@ -11,6 +11,17 @@ import requests
 import time
 from datetime import datetime
 
+import quota
+from ranking import top_k
+from cadence import AdaptiveCadence
+from config import (
+    DATA_UPDATE_INTERVAL_MINUTES,
+    REFRESH_MIN_SECONDS,
+    REFRESH_MAX_SECONDS,
+    REFRESH_HIGH_CHANGE,
+    REFRESH_LOW_CHANGE,
+)
+
 try:
     from telegram import Update
     from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, CallbackContext
@@ -32,6 +43,20 @@ TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN', '')
 SUBSCRIBERS_FILE = 'subscribers.json'
 DATA_CACHE_FILE = 'telegram_crypto_data.json'
 
+# CoinGecko key budget, shared with the web app
+coingecko_quota = quota.coingecko_budget()
+
+# Data updates speed up while the market is moving and back off when it is flat
+update_cadence = AdaptiveCadence(
+    min_seconds=REFRESH_MIN_SECONDS,
+    max_seconds=REFRESH_MAX_SECONDS,
+    initial_seconds=DATA_UPDATE_INTERVAL_MINUTES * 60,
+    high_change=REFRESH_HIGH_CHANGE,
+    low_change=REFRESH_LOW_CHANGE,
+    quota=coingecko_quota,
+    name="margin data"
+)
+
 # Cached data
 cached_data = "Данные ещё не загружены."
 
@@ -76,10 +101,12 @@ def get_sample_data():
     ]
     return sample_data
 
-def fetch_margin_data():
+def fetch_margin_data(priority=quota.ON_DEMAND):
     """
     Fetches cryptocurrency leverage indicator data from different sources
     Returns the top 10 cryptocurrencies by leverage indicator
+    Only scheduled refreshes (priority=quota.SCHEDULED) may spend the
+    CoinGecko quota's reserve
     """
     try:
         # Try the web app's API endpoint first for data sharing
@@ -100,7 +127,10 @@ def fetch_margin_data():
         except Exception as e:
             logger.warning(f"Could not fetch data from web app: {e}")
         
-        # Try CoinGecko API directly
+        # Try CoinGecko API directly, unless the shared key budget is spent
+        # (the cache file below is used instead)
+        if not coingecko_quota.acquire(priority):
+            raise quota.QuotaExhausted("CoinGecko quota exhausted")
         logger.info("Trying to fetch data from CoinGecko API")
         url = "https://api.coingecko.com/api/v3/coins/markets"
         params = {
@@ -119,6 +149,8 @@ def fetch_margin_data():
         }
         
         response = requests.get(url, params=params, headers=headers, timeout=10)
+        if response.status_code == 429:
+            coingecko_quota.penalize(quota.retry_after_seconds(response.headers.get('Retry-After')))
         if response.status_code != 200:
             logger.warning(f"CoinGecko API error: {response.status_code}")
             # If CoinGecko API fails, use sample data
@@ -158,10 +190,10 @@ def fetch_margin_data():
         filtered_data = [item for item in result if item.get('ratio', 0) > 10]
         # Use filtered data if available, otherwise use all data
         if filtered_data:
-            top = sorted(filtered_data, key=lambda x: x.get('ratio', 0), reverse=True)[:10]
+            top = top_k(filtered_data, 10)
         else:
             # If no items with ratio > 10, use the top 10 by ratio
-            top = sorted(result, key=lambda x: x.get('ratio', 0), reverse=True)[:10]
+            top = top_k(result, 10)
         
         # Save data to cache file for backup
         with open(DATA_CACHE_FILE, 'w') as f:
@@ -206,12 +238,13 @@ def format_data_for_telegram(data):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M UTC")
     return f"<pre>{output}\n\nUpdated: {timestamp}</pre>"
 
-def update_cached_data():
+def update_cached_data(priority=quota.ON_DEMAND):
     """Update the global cached data"""
     global cached_data
     logger.info("Updating data from sources...")
     try:
-        data = fetch_margin_data()
+        data = fetch_margin_data(priority)
+        update_cadence.observe(data)
         cached_data = format_data_for_telegram(data)
     except Exception as e:
         logger.error(f"Error updating data: {e}")
@@ -267,8 +300,14 @@ def main():
 
     scheduler = BackgroundScheduler()
 
-    # Update data every 10 minutes
-    scheduler.add_job(update_cached_data, 'interval', minutes=10)
+    # Update data, adapting the interval after each update
+    def scheduled_update():
+        try:
+            update_cached_data(quota.SCHEDULED)
+        finally:
+            scheduler.reschedule_job('update_cached_data', trigger='interval', seconds=update_cadence.interval)
+
+    scheduler.add_job(scheduled_update, 'interval', seconds=update_cadence.interval, id='update_cached_data')
 
     # Send daily report at 10:00 UTC
     scheduler.add_job(
@@ -0,0 +1,91 @@
+"""
+Module for fanning out snapshot updates to Server-Sent Events clients
+"""
+
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class SnapshotStreamHub:
+    """
+    Single fan-out point for live snapshot updates.
+
+    The hub keeps only the latest encoded event. Every connected client
+    holds nothing but the ID of the last event it sent and waits on one
+    shared condition, so an idle connection costs a blocked wait rather
+    than a queue of its own. Run under gunicorn's gevent worker, each wait
+    is a greenlet, which keeps thousands of idle streams cheap. Under a
+    threaded worker each wait holds a thread, so `max_clients` should stay
+    below the thread count: clients over it get an SSE retry hint and are
+    disconnected instead of blocking the worker.
+    """
+
+    def __init__(self, keepalive_seconds: int = 15, max_clients: Optional[int] = None,
+                 retry_seconds: int = 30):
+        self.keepalive_seconds = keepalive_seconds
+        self.max_clients = max_clients
+        self.retry_seconds = retry_seconds
+        self._condition = threading.Condition()
+        self._event_id: Optional[str] = None
+        self._event: Optional[str] = None
+        self._clients = 0
+
+    @property
+    def client_count(self) -> int:
+        """Number of currently connected clients."""
+        return self._clients
+
+    def publish(self, event_id: Any, payload: Dict[str, Any], event_type: str = "snapshot") -> None:
+        """
+        Encode an event once and wake every waiting client.
+
+        Args:
+            event_id: ID sent as the SSE event id (the snapshot ID)
+            payload: JSON-serializable event data
+            event_type: SSE event name
+        """
+        encoded = f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload, default=str)}\n\n"
+        with self._condition:
+            self._event_id = str(event_id)
+            self._event = encoded
+            self._condition.notify_all()
+        logger.debug(f"Published event {event_id} to {self._clients} stream clients")
+
+    def stream(self, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield SSE-encoded events for one client.
+
+        The latest event is sent straight away unless the client already
+        has it (Last-Event-ID on reconnect); keep-alive comments are sent
+        while nothing changes so proxies don't drop the connection.
+        """
+        with self._condition:
+            full = self.max_clients is not None and self._clients >= self.max_clients
+            if not full:
+                self._clients += 1
+        if full:
+            logger.warning(f"Stream limit of {self.max_clients} clients reached, asking client to retry")
+            yield f"retry: {self.retry_seconds * 1000}\n: stream full\n\n"
+            return
+
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._event_id is not None and self._event_id != last_event_id,
+                        timeout=self.keepalive_seconds
+                    )
+                    event_id, event = self._event_id, self._event
+
+                if event is not None and event_id != last_event_id:
+                    last_event_id = event_id
+                    yield event
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            with self._condition:
+                self._clients -= 1
@@ -3,16 +3,19 @@
 Standalone Telegram bot for Crypto Leverage Indicator tracker
 This runs independently of the main Flask application
 """
+import asyncio
+import hashlib
 import json
 import logging
 import os
-import time
-from datetime import datetime
-from typing import Dict, List
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time
+from typing import Dict, List, Optional, Tuple
 
 import requests
 import pytz
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -21,6 +24,28 @@ from telegram.ext import (
 )
 from apscheduler.schedulers.background import BackgroundScheduler
 
+import quota
+from alerts import ABOVE, ANY, BELOW, AlertEngine, AlertRule
+from cadence import AdaptiveCadence
+from config import (
+    ALERT_COOLDOWN_SECONDS,
+    ALERT_HYSTERESIS,
+    MAX_ALERTS_PER_CHAT,
+    MAX_REPORT_TOP_N,
+    MAX_WATCHLIST_SIZE,
+    OUTBOUND_BURST,
+    OUTBOUND_RATE_PER_SECOND,
+    OUTBOUND_WORKERS,
+    REPORT_CACHE_SIZE,
+    REPORT_SLOT_MINUTES,
+    REFRESH_MIN_SECONDS,
+    REFRESH_MAX_SECONDS,
+    REFRESH_HIGH_CHANGE,
+    REFRESH_LOW_CHANGE,
+)
+from send_queue import ALERT, BULK, INTERACTIVE, OutboundQueue
+from singleflight import SingleFlight
+
 # Configure logging
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -30,8 +55,14 @@ logger = logging.getLogger(__name__)
 
 # Constants
 SUBSCRIBERS_FILE = "telegram_subscribers.json"
+ALERTS_FILE = "telegram_alerts.json"
+PREFERENCES_FILE = "telegram_preferences.json"
+DEFAULT_PREFERENCES = {"top_n": 10, "watchlist": [], "delivery_time": "12:00", "timezone": "UTC"}
+REPORT_JOB_PREFIX = "daily_report_"
 CACHE_FILE = "telegram_crypto_data.json"
 API_URL = "http://localhost:5000/api/crypto-data"
+ANOMALIES_URL = "http://localhost:5000/api/anomalies"
+ANOMALY_CURSOR_FILE = "telegram_anomaly_cursor.json"
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 if not TELEGRAM_TOKEN:
     logger.error("TELEGRAM_TOKEN environment variable not set. Bot will not work.")
@@ -39,6 +70,43 @@ if not TELEGRAM_TOKEN:
 # Initialize scheduler
 scheduler = BackgroundScheduler()
 
+# Last data received from the web application API, kept so later polls
+# only need to fetch what changed (a delta or a 304)
+_api_cache = {"etag": None, "snapshot_id": None, "data": []}
+
+# The bot's event loop, set once the application starts. Scheduler jobs
+# run on their own threads and hand coroutines over to it.
+_bot_loop = {"loop": None}
+
+# Concurrent /margin commands, reports and scheduled updates share one fetch
+margin_fetches = SingleFlight()
+
+# Scheduled updates start hourly and speed up while the market is moving.
+# Each one makes the web app spend the shared CoinGecko budget.
+update_cadence = AdaptiveCadence(
+    min_seconds=REFRESH_MIN_SECONDS,
+    max_seconds=REFRESH_MAX_SECONDS,
+    initial_seconds=3600,
+    high_change=REFRESH_HIGH_CHANGE,
+    low_change=REFRESH_LOW_CHANGE,
+    quota=quota.coingecko_budget(),
+    name="margin data"
+)
+
+def telegram_retry_after(error: Exception) -> Optional[float]:
+    """Seconds Telegram asks us to wait after flood control, or None for other errors"""
+    return error.retry_after if isinstance(error, RetryAfter) else None
+
+# Every outgoing message goes through this queue: replies first, then
+# alerts, then reports, under one global rate limit
+outbox = OutboundQueue(
+    rate_per_second=OUTBOUND_RATE_PER_SECOND,
+    burst=OUTBOUND_BURST,
+    workers=OUTBOUND_WORKERS,
+    retry_after=telegram_retry_after,
+    name="telegram-outbox"
+)
+
 def load_subscribers() -> List[int]:
     """Load subscribers from file"""
     try:
@@ -76,6 +144,93 @@ def remove_subscriber(chat_id: int) -> bool:
         return True
     return False
 
+def load_preferences() -> Dict[str, Dict]:
+    """Load every chat's report preferences from file, keyed by chat ID as a string"""
+    try:
+        if os.path.exists(PREFERENCES_FILE):
+            with open(PREFERENCES_FILE, "r") as f:
+                return json.load(f)
+        return {}
+    except Exception as e:
+        logger.error(f"Error loading preferences: {e}")
+        return {}
+
+def save_preferences(preferences: Dict[str, Dict]) -> None:
+    """Save every chat's report preferences to file"""
+    try:
+        with open(PREFERENCES_FILE, "w") as f:
+            json.dump(preferences, f)
+    except Exception as e:
+        logger.error(f"Error saving preferences: {e}")
+
+def get_preferences(chat_id: int, preferences: Optional[Dict[str, Dict]] = None) -> Dict:
+    """Return a chat's report preferences, falling back to the defaults"""
+    if preferences is None:
+        preferences = load_preferences()
+    return dict(DEFAULT_PREFERENCES, **preferences.get(str(chat_id), {}))
+
+def update_preferences(chat_id: int, **changes) -> Dict:
+    """Change some of a chat's report preferences and return the result"""
+    preferences = load_preferences()
+    chat_preferences = dict(get_preferences(chat_id, preferences), **changes)
+    if chat_preferences == DEFAULT_PREFERENCES:
+        preferences.pop(str(chat_id), None)
+    else:
+        preferences[str(chat_id)] = chat_preferences
+    save_preferences(preferences)
+    return chat_preferences
+
+def preference_key(prefs: Dict) -> str:
+    """Hash of a set of preferences; chats with the same key get the same report"""
+    canonical = json.dumps({"top_n": prefs["top_n"], "watchlist": sorted(prefs["watchlist"])})
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+def delivery_slot(prefs: Dict, day: Optional[date] = None) -> int:
+    """
+    Return the UTC slot (0 = 00:00 UTC) a chat's local delivery time falls
+    in on the given day. The day matters because of daylight saving time.
+    """
+    day = day or datetime.utcnow().date()
+    hour, minute = map(int, prefs["delivery_time"].split(":"))
+    local = pytz.timezone(prefs["timezone"]).localize(datetime.combine(day, dt_time(hour, minute)))
+    utc = local.astimezone(pytz.utc)
+    return (utc.hour * 60 + utc.minute) // REPORT_SLOT_MINUTES
+
+def slot_start(slot: int) -> Tuple[int, int]:
+    """Return the UTC (hour, minute) a slot starts at"""
+    return divmod(slot * REPORT_SLOT_MINUTES, 60)
+
+def group_by_slot(chat_ids: List[int]) -> Dict[int, List[int]]:
+    """Bucket chats by the UTC slot their report is due in today"""
+    preferences = load_preferences()
+    slots: Dict[int, List[int]] = {}
+    for chat_id in chat_ids:
+        slots.setdefault(delivery_slot(get_preferences(chat_id, preferences)), []).append(chat_id)
+    return slots
+
+def load_alert_rules() -> List[AlertRule]:
+    """Load alert rules from file"""
+    try:
+        if os.path.exists(ALERTS_FILE):
+            with open(ALERTS_FILE, "r") as f:
+                return [AlertRule(**rule) for rule in json.load(f)]
+        return []
+    except Exception as e:
+        logger.error(f"Error loading alert rules: {e}")
+        return []
+
+def save_alert_rules() -> None:
+    """Save every registered alert rule to file"""
+    try:
+        with open(ALERTS_FILE, "w") as f:
+            json.dump([rule.to_dict() for rule in list(alert_engine.rules.values())], f)
+    except Exception as e:
+        logger.error(f"Error saving alert rules: {e}")
+
+# Alert rules are evaluated against every scheduled update
+alert_engine = AlertEngine(hysteresis=ALERT_HYSTERESIS, cooldown_seconds=ALERT_COOLDOWN_SECONDS)
+alert_engine.add_rules(load_alert_rules())
+
 def get_sample_data() -> List[Dict]:
     """Return sample data for demonstration purposes"""
     return [
@@ -113,15 +268,36 @@ def fetch_margin_data() -> List[Dict]:
     Fetches cryptocurrency leverage indicator data from web app API or directly from CoinGecko
     Returns the top cryptocurrencies by leverage indicator
     """
+    return margin_fetches.do("margin", _fetch_margin_data)
+
+def _fetch_margin_data() -> List[Dict]:
     logger.info("Trying to fetch data from web application API")
     logger.info(f"Using API URL: {API_URL}")
     
     try:
-        # Try to fetch data from the web application's API
-        response = requests.get(API_URL, timeout=5)
+        # Try to fetch data from the web application's API. Once we hold a
+        # snapshot only the changes since it are requested; before that the
+        # previous response is revalidated with its ETag.
+        params = {}
+        headers = {}
+        if _api_cache["snapshot_id"] is not None:
+            params["since"] = _api_cache["snapshot_id"]
+        elif _api_cache["etag"]:
+            headers["If-None-Match"] = _api_cache["etag"]
+        response = requests.get(API_URL, params=params, headers=headers, timeout=5)
+        if response.status_code == 304:
+            logger.info("Web application data not modified, reusing previous response")
+            return _api_cache["data"][:20]
         if response.status_code == 200:
             logger.info("Successfully fetched data from web application")
-            data = response.json().get("data", [])
+            body = response.json()
+            if body.get("full", True):
+                data = body.get("data", [])
+            else:
+                data = apply_delta(_api_cache["data"], body)
+            _api_cache["etag"] = response.headers.get("ETag")
+            _api_cache["snapshot_id"] = body.get("snapshot_id")
+            _api_cache["data"] = data
             return data[:20]  # Return top 20 cryptocurrencies
     except Exception as e:
         logger.error(f"Error fetching data from web application: {e}")
@@ -140,37 +316,239 @@ def fetch_margin_data() -> List[Dict]:
     logger.info("Using sample data")
     return get_sample_data()
 
-def format_data_for_telegram(data: List[Dict]) -> str:
-    """Convert data to a nicely formatted string for Telegram"""
+# Rendered report bodies keyed by (snapshot key, preference key), newest last
+_report_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+def snapshot_key(data: List[Dict]) -> str:
+    """Hash of the data a report is rendered from"""
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def render_report(data: List[Dict], prefs: Dict, data_key: Optional[str] = None) -> str:
+    """
+    Render the report for one set of preferences, reusing the body
+    already rendered for the same data and preferences. The header, with
+    the current time, is added fresh each time.
+    """
+    key = (data_key or snapshot_key(data), preference_key(prefs))
+    body = _report_cache.get(key)
+    if body is None:
+        body = format_report_body(data, prefs["top_n"], prefs["watchlist"])
+        _report_cache[key] = body
+        if len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    else:
+        _report_cache.move_to_end(key)
+    return format_report_header() + body
+
+def group_by_preferences(chat_ids: List[int]) -> List[Tuple[Dict, List[int]]]:
+    """Group chats that share the same report preferences"""
+    preferences = load_preferences()
+    groups: Dict[str, Tuple[Dict, List[int]]] = {}
+    for chat_id in chat_ids:
+        prefs = get_preferences(chat_id, preferences)
+        groups.setdefault(preference_key(prefs), (prefs, []))[1].append(chat_id)
+    return list(groups.values())
+
+def apply_delta(data: List[Dict], delta: Dict) -> List[Dict]:
+    """Apply a delta response from the web application API to previously fetched data"""
+    by_symbol = {item["symbol"]: item for item in data}
+    for symbol in delta.get("removed", []):
+        by_symbol.pop(symbol, None)
+    for item in delta.get("inserted", []) + delta.get("updated", []):
+        by_symbol[item["symbol"]] = item
+    return sorted(by_symbol.values(), key=lambda x: x.get("ratio", 0), reverse=True)
+
+def load_anomaly_cursor():
+    """Load the ID of the last anomaly sent to subscribers, or None"""
+    try:
+        if os.path.exists(ANOMALY_CURSOR_FILE):
+            with open(ANOMALY_CURSOR_FILE, "r") as f:
+                return json.load(f).get("last_id")
+    except Exception as e:
+        logger.error(f"Error loading anomaly cursor: {e}")
+    return None
+
+def save_anomaly_cursor(last_id: int) -> None:
+    """Save the ID of the last anomaly sent to subscribers"""
+    try:
+        with open(ANOMALY_CURSOR_FILE, "w") as f:
+            json.dump({"last_id": last_id}, f)
+    except Exception as e:
+        logger.error(f"Error saving anomaly cursor: {e}")
+
+def fetch_new_anomalies() -> Tuple[List[Dict], Optional[int]]:
+    """
+    Fetch anomalies the web application detected since the saved cursor.
+
+    Returns the anomalies and the cursor to save once they have been
+    queued for sending (None if it hasn't moved). The first call only
+    finds where the queue stands, so a new bot doesn't replay old
+    anomalies.
+    """
+    last_id = load_anomaly_cursor()
+    try:
+        params = {"after": last_id} if last_id is not None else {"limit": 1}
+        response = requests.get(ANOMALIES_URL, params=params, timeout=5)
+        response.raise_for_status()
+        body = response.json()
+    except Exception as e:
+        logger.error(f"Error fetching anomalies from web application: {e}")
+        return [], None
+
+    new_last_id = body.get("last_id")
+    if new_last_id == last_id:
+        new_last_id = None
+    return (body.get("data", []) if last_id is not None else []), new_last_id
+
+def format_anomalies_for_telegram(anomalies: List[Dict]) -> str:
+    """Convert detected anomalies to a message for Telegram"""
+    message = "⚠️ *Unusual leverage indicator spikes* ⚠️\n\n"
+    for item in anomalies:
+        message += (
+            f"*{item['symbol']}*: *{item['ratio']:.2f}* vs. baseline {item['baseline']:.2f} "
+            f"({item['zscore']:.1f}σ)\n"
+        )
+    return message
+
+def format_crypto_entry(label: str, crypto: Dict) -> str:
+    """Format one cryptocurrency's lines of a Telegram report"""
+    symbol = crypto.get("symbol", "")
+    name = crypto.get("name", "")
+    ratio = crypto.get("ratio", 0)
+    borrow = crypto.get("borrow_formatted", "0")
+    repay = crypto.get("repay_formatted", "0")
+
+    return (
+        f"{label} *{symbol}* ({name})\n"
+        f"   Leverage Indicator: *{ratio:.2f}*\n"
+        f"   Borrow: {borrow} | Repay: {repay}\n\n"
+    )
+
+def format_report_header() -> str:
+    """Report title with the current time, kept out of the cached report body"""
     current_time = datetime.now(pytz.timezone("UTC")).strftime("%Y-%m-%d %H:%M:%S UTC")
-    message = f"🔥 *Top Crypto Leverage Indicators* 🔥\n{current_time}\n\n"
-    
-    for i, crypto in enumerate(data[:10], 1):  # Top 10 for Telegram messages
-        symbol = crypto.get("symbol", "")
-        name = crypto.get("name", "")
-        ratio = crypto.get("ratio", 0)
-        borrow = crypto.get("borrow_formatted", "0")
-        repay = crypto.get("repay_formatted", "0")
-        
-        message += f"{i}. *{symbol}* ({name})\n"
-        message += f"   Leverage Indicator: *{ratio:.2f}*\n"
-        message += f"   Borrow: {borrow} | Repay: {repay}\n\n"
+    return f"🔥 *Top Crypto Leverage Indicators* 🔥\n{current_time}\n\n"
+
+def format_data_for_telegram(data: List[Dict], top_n: int = 10, watchlist: Optional[List[str]] = None) -> str:
+    """
+    Convert data to a nicely formatted string for Telegram: the top `top_n`
+    cryptocurrencies, followed by any watchlist coins outside them
+    """
+    return format_report_header() + format_report_body(data, top_n, watchlist)
+
+def format_report_body(data: List[Dict], top_n: int = 10, watchlist: Optional[List[str]] = None) -> str:
+    """Everything in a report below the header; depends only on the data and preferences"""
+    message = ""
+    for i, crypto in enumerate(data[:top_n], 1):
+        message += format_crypto_entry(f"{i}.", crypto)
+
+    if watchlist:
+        ranks = {crypto.get("symbol"): (i, crypto) for i, crypto in enumerate(data, 1)}
+        # In ranking order, so the report doesn't depend on the order coins were added
+        rest = sorted(
+            (symbol for symbol in watchlist if symbol not in ranks or ranks[symbol][0] > top_n),
+            key=lambda symbol: (ranks[symbol][0] if symbol in ranks else len(data) + 1, symbol)
+        )
+        if rest:
+            message += "👀 *Your watchlist*\n"
+            for symbol in rest:
+                if symbol in ranks:
+                    i, crypto = ranks[symbol]
+                    message += format_crypto_entry(f"{i}.", crypto)
+                else:
+                    message += f"• *{symbol}* is not in the top {len(data)} right now\n"
+            message += "\n"
     
     message += "Data source: CoinGecko API\n"
     message += "Leverage Indicator = Volume/Market Cap Ratio\n"
     
     return message
 
-def update_cached_data() -> None:
-    """Update the global cached data"""
+def update_cached_data() -> List[Dict]:
+    """Update the global cached data and return it"""
     logger.info("Updating data from sources...")
     data = fetch_margin_data()
+    update_cadence.observe(data)
     try:
         with open(CACHE_FILE, "w") as f:
             json.dump(data, f)
         logger.info("Data cached successfully")
     except Exception as e:
         logger.error(f"Error caching data: {e}")
+    logger.info(f"Fetch coalescing: {margin_fetches.metrics()}")
+    logger.info(f"Outbound queue: {outbox.metrics()}")
+    return data
+
+def run_on_bot_loop(coro) -> bool:
+    """
+    Run a coroutine on the bot's event loop from another thread, such as
+    a scheduler job. Returns False, without running it, if the bot loop
+    isn't running.
+    """
+    loop = _bot_loop["loop"]
+    if loop is None or loop.is_closed():
+        logger.warning(f"Bot event loop not running, skipping {coro.__name__}")
+        coro.close()
+        return False
+
+    def log_failure(future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"{coro.__name__} failed: {future.exception()}")
+
+    try:
+        asyncio.run_coroutine_threadsafe(coro, loop).add_done_callback(log_failure)
+    except RuntimeError as e:
+        # The loop closed in the meantime
+        logger.warning(f"Could not hand {coro.__name__} to the bot event loop: {e}")
+        coro.close()
+        return False
+    return True
+
+async def check_alerts(application: Application, data: List[Dict]) -> None:
+    """Evaluate alert rules against new data and send the alerts that fire."""
+    fired = await asyncio.to_thread(alert_engine.evaluate, data)
+    if fired:
+        await send_alerts(application, fired)
+
+async def check_anomalies(application: Application) -> None:
+    """
+    Send anomalies detected since the last check to all subscribers. The
+    cursor only moves once the messages are queued, so anomalies that
+    couldn't be queued are fetched again next time.
+    """
+    anomalies, last_id = await asyncio.to_thread(fetch_new_anomalies)
+    sends = queue_anomalies(application, anomalies) if anomalies else {}
+    if last_id is not None:
+        save_anomaly_cursor(last_id)
+    if sends:
+        await deliver(sends, "anomalies")
+
+def scheduled_update(application: Application) -> None:
+    """
+    Update the cached data, send any alerts it triggers and any new
+    anomalies, then schedule the next update at the adapted interval
+    """
+    try:
+        data = update_cached_data()
+        # Alert state only changes once the evaluation is running on the bot loop
+        run_on_bot_loop(check_alerts(application, data))
+        run_on_bot_loop(check_anomalies(application))
+    finally:
+        scheduler.reschedule_job("update_cached_data", trigger="interval", seconds=update_cadence.interval)
+
+async def reply(update: Update, text: str, **kwargs):
+    """Reply to a command through the outbound queue, ahead of alerts and reports."""
+    return await outbox.send(INTERACTIVE, update.effective_chat.id, update.message.reply_text, text, **kwargs)
+
+async def deliver(sends: Dict[int, asyncio.Future], what: str) -> None:
+    """Wait for queued sends and log the ones that failed."""
+    results = await asyncio.gather(*sends.values(), return_exceptions=True)
+    failed = 0
+    for chat_id, result in zip(sends, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"Error sending {what} to {chat_id}: {result}")
+    logger.info(f"Sent {what} to {len(sends) - failed} of {len(sends)} chats")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
@@ -181,28 +559,41 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "Available commands:\n"
         "/margin - Get the latest crypto leverage indicator data\n"
         "/subscribe - Subscribe to daily updates\n"
-        "/unsubscribe - Unsubscribe from daily updates\n\n"
+        "/unsubscribe - Unsubscribe from daily updates\n"
+        "/alert SOL > 50 - Alert when a coin's leverage indicator crosses a value "
+        "(use 'any' for every coin)\n"
+        "/alerts - List your alerts\n"
+        "/unalert <id> - Remove an alert\n"
+        "/watch SOL ETH - Always include coins in your reports\n"
+        "/unwatch SOL - Remove coins from your watchlist\n"
+        "/top 5 - Choose how many top coins your reports show\n"
+        "/time 09:00 Europe/Berlin - Choose when your daily report arrives\n"
+        "/settings - Show your report settings\n\n"
         "Powered by CoinGecko API"
     )
-    await update.message.reply_text(welcome_message)
+    await reply(update, welcome_message)
 
 async def margin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send the current margin data when the command /margin is issued."""
-    await update.message.reply_text("Fetching the latest data... 🔍")
-    data = fetch_margin_data()
-    message = format_data_for_telegram(data)
-    await update.message.reply_text(message, parse_mode="Markdown")
+    await reply(update, "Fetching the latest data... 🔍")
+    # Fetch in a thread so concurrent commands can join the same fetch
+    data = await asyncio.to_thread(fetch_margin_data)
+    message = render_report(data, get_preferences(update.effective_chat.id))
+    await reply(update, message, parse_mode="Markdown")
 
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Subscribe to daily margin reports."""
     chat_id = update.effective_chat.id
     if add_subscriber(chat_id):
-        await update.message.reply_text(
+        sync_report_jobs(context.application)
+        prefs = get_preferences(chat_id)
+        await reply(update,
             "✅ You've successfully subscribed to daily leverage indicator reports! "
-            "You'll receive updates every day at 12:00 UTC."
+            f"You'll receive updates every day at {prefs['delivery_time']} {prefs['timezone']}. "
+            "Use /time to change it."
         )
     else:
-        await update.message.reply_text(
+        await reply(update,
             "You're already subscribed to daily reports! "
             "Use /unsubscribe to unsubscribe."
         )
@@ -211,65 +602,302 @@ async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     """Unsubscribe from daily margin reports."""
     chat_id = update.effective_chat.id
     if remove_subscriber(chat_id):
-        await update.message.reply_text(
+        sync_report_jobs(context.application)
+        await reply(update,
             "❌ You've been unsubscribed from daily reports. "
             "Use /subscribe to subscribe again."
         )
     else:
-        await update.message.reply_text(
+        await reply(update,
             "You're not subscribed to daily reports. "
             "Use /subscribe to subscribe."
         )
 
-async def send_daily_report(context: CallbackContext) -> None:
-    """Send daily reports to all subscribers."""
+async def watch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Add coins to the chat's watchlist when the command /watch is issued."""
+    chat_id = update.effective_chat.id
+    symbols = [arg.upper().strip(",") for arg in context.args if arg.strip(",")]
+    if not symbols:
+        await reply(update, "Usage: /watch <coin> [<coin> ...], e.g. /watch SOL ETH")
+        return
+
+    watchlist = get_preferences(chat_id)["watchlist"]
+    watchlist = watchlist + [symbol for symbol in dict.fromkeys(symbols) if symbol not in watchlist]
+    if len(watchlist) > MAX_WATCHLIST_SIZE:
+        await reply(update,
+            f"Your watchlist can hold up to {MAX_WATCHLIST_SIZE} coins. Use /unwatch to remove some."
+        )
+        return
+    update_preferences(chat_id, watchlist=watchlist)
+    await reply(update, f"👀 Watching: {', '.join(watchlist)}")
+
+async def unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Remove coins from the chat's watchlist when the command /unwatch is issued."""
+    chat_id = update.effective_chat.id
+    symbols = {arg.upper().strip(",") for arg in context.args}
+    if not symbols:
+        await reply(update, "Usage: /unwatch <coin> [<coin> ...], or /unwatch all")
+        return
+
+    watchlist = get_preferences(chat_id)["watchlist"]
+    watchlist = [] if "ALL" in symbols else [symbol for symbol in watchlist if symbol not in symbols]
+    update_preferences(chat_id, watchlist=watchlist)
+    await reply(update,
+        f"👀 Watching: {', '.join(watchlist)}" if watchlist else "Your watchlist is empty."
+    )
+
+async def top(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Set how many top coins the chat's reports show when the command /top is issued."""
+    try:
+        top_n = int(context.args[0])
+        if not 1 <= top_n <= MAX_REPORT_TOP_N:
+            raise ValueError
+    except (IndexError, ValueError):
+        await reply(update, f"Usage: /top <1-{MAX_REPORT_TOP_N}>, e.g. /top 5")
+        return
+    update_preferences(update.effective_chat.id, top_n=top_n)
+    await reply(update, f"Your reports will show the top {top_n} coins.")
+
+async def delivery_time(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Set the chat's local daily report time when the command /time is issued."""
+    chat_id = update.effective_chat.id
+    prefs = get_preferences(chat_id)
+    try:
+        hour, minute = map(int, context.args[0].split(":"))
+        dt_time(hour, minute)
+        timezone = context.args[1] if len(context.args) > 1 else prefs["timezone"]
+        timezone = pytz.timezone(timezone).zone
+    except (IndexError, ValueError, pytz.UnknownTimeZoneError):
+        await reply(update,
+            "Usage: /time <HH:MM> [timezone], e.g. /time 09:00 Europe/Berlin"
+        )
+        return
+
+    prefs = update_preferences(chat_id, delivery_time=f"{hour:02d}:{minute:02d}", timezone=timezone)
+    sync_report_jobs(context.application)
+    # Reports go out at the start of the slot the time falls in
+    slot_hour, slot_minute = slot_start(delivery_slot(prefs))
+    utc_start = pytz.utc.localize(datetime.combine(datetime.utcnow().date(), dt_time(slot_hour, slot_minute)))
+    local_start = utc_start.astimezone(pytz.timezone(timezone)).strftime("%H:%M")
+    await reply(update,
+        f"🕘 Daily reports will arrive at {local_start} {timezone} "
+        f"(the {REPORT_SLOT_MINUTES}-minute slot starting {slot_hour:02d}:{slot_minute:02d} UTC)."
+    )
+
+async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show the chat's report preferences when the command /settings is issued."""
+    prefs = get_preferences(update.effective_chat.id)
+    watchlist = ", ".join(prefs["watchlist"]) or "empty"
+    await reply(update,
+        f"Report settings:\n"
+        f"Top coins: {prefs['top_n']}\n"
+        f"Watchlist: {watchlist}\n"
+        f"Daily report: {prefs['delivery_time']} {prefs['timezone']}"
+    )
+
+def parse_alert_args(args: List[str]) -> AlertRule:
+    """
+    Parse "/alert" arguments such as ["SOL", ">", "50"], ["any", "<", "10"]
+    or ["SOL>50"] into an unregistered rule.
+
+    Raises:
+        ValueError: If the arguments are not a valid rule
+    """
+    text = "".join(args)
+    for op in (ABOVE, BELOW):
+        symbol, found, threshold = text.partition(op)
+        if found:
+            break
+    else:
+        raise ValueError("missing > or <")
+    if not symbol:
+        raise ValueError("missing coin")
+    symbol = ANY if symbol.lower() in ("any", ANY) else symbol
+    return AlertRule(0, 0, symbol, op, float(threshold))
+
+async def alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Register an alert when the command /alert is issued."""
+    chat_id = update.effective_chat.id
+    try:
+        parsed = parse_alert_args(context.args)
+    except ValueError:
+        await reply(update,
+            "Usage: /alert <coin|any> > or < <value>\n"
+            "Examples: /alert SOL > 50, /alert any > 100"
+        )
+        return
+
+    if len(alert_engine.rules_for_chat(chat_id)) >= MAX_ALERTS_PER_CHAT:
+        await reply(update,
+            f"You already have {MAX_ALERTS_PER_CHAT} alerts. "
+            "Use /alerts to list them and /unalert to remove one."
+        )
+        return
+
+    rule = alert_engine.add_rule(chat_id, parsed.symbol, parsed.op, parsed.threshold)
+    save_alert_rules()
+    await reply(update,
+        f"🔔 Alert {rule.describe()} set. "
+        "If the condition already holds, you'll be alerted on its next crossing."
+    )
+
+async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """List the chat's alerts when the command /alerts is issued."""
+    rules = alert_engine.rules_for_chat(update.effective_chat.id)
+    if not rules:
+        await reply(update, "You have no alerts. Use /alert to add one.")
+        return
+    await reply(update,
+        "Your alerts:\n" + "\n".join(rule.describe() for rule in rules)
+    )
+
+async def unalert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Remove one of the chat's alerts when the command /unalert is issued."""
+    chat_id = update.effective_chat.id
+    try:
+        rule_id = int(context.args[0].lstrip("#"))
+    except (IndexError, ValueError):
+        await reply(update, "Usage: /unalert <id> (see /alerts)")
+        return
+
+    rule = alert_engine.rules.get(rule_id)
+    if rule is None or rule.chat_id != chat_id:
+        await reply(update, f"You have no alert #{rule_id}.")
+        return
+    alert_engine.remove_rule(rule_id)
+    save_alert_rules()
+    await reply(update, f"Alert #{rule_id} removed.")
+
+async def send_alerts(context: CallbackContext, fired: List) -> None:
+    """Send triggered alerts, one message per chat."""
+    by_chat: Dict[int, List[str]] = {}
+    for rule, symbol, ratio in fired:
+        direction = "above" if rule.op == ABOVE else "below"
+        by_chat.setdefault(rule.chat_id, []).append(
+            f"*{symbol}* leverage indicator is {direction} {rule.threshold:g}: *{ratio:.2f}* (alert #{rule.rule_id})"
+        )
+
+    logger.info(f"Sending {len(fired)} alerts to {len(by_chat)} chats")
+    sends = {
+        chat_id: outbox.submit(
+            ALERT, chat_id, context.bot.send_message,
+            chat_id=chat_id,
+            text="🔔 *Leverage indicator alert*\n\n" + "\n".join(lines),
+            parse_mode="Markdown"
+        )
+        for chat_id, lines in by_chat.items()
+    }
+    await deliver(sends, "alerts")
+
+def queue_anomalies(context: CallbackContext, anomalies: List[Dict]) -> Dict[int, asyncio.Future]:
+    """Queue newly detected anomalies for all subscribers."""
     subscribers = load_subscribers()
+    logger.info(f"Sending {len(anomalies)} anomalies to {len(subscribers)} subscribers")
+    message = format_anomalies_for_telegram(anomalies)
+
+    return {
+        chat_id: outbox.submit(ALERT, chat_id, context.bot.send_message,
+                               chat_id=chat_id, text=message, parse_mode="Markdown")
+        for chat_id in subscribers
+    }
+
+def sync_report_jobs(application: Application) -> None:
+    """
+    Keep one daily report job per UTC slot that has subscribers due in it,
+    adding jobs for newly used slots and removing jobs for empty ones.
+    """
+    slots = set(group_by_slot(load_subscribers()))
+    scheduled = {job.id for job in scheduler.get_jobs() if job.id.startswith(REPORT_JOB_PREFIX)}
+
+    for job_id in scheduled - {f"{REPORT_JOB_PREFIX}{slot}" for slot in slots}:
+        scheduler.remove_job(job_id)
+    for slot in slots:
+        job_id = f"{REPORT_JOB_PREFIX}{slot}"
+        if job_id not in scheduled:
+            hour, minute = slot_start(slot)
+            scheduler.add_job(
+                lambda slot=slot: run_on_bot_loop(send_daily_report(application, slot)),
+                'cron',
+                hour=hour,
+                minute=minute,
+                timezone=pytz.utc,
+                id=job_id
+            )
+    logger.info(f"Daily reports scheduled in {len(slots)} slots")
+
+async def send_daily_report(context: CallbackContext, slot: Optional[int] = None) -> None:
+    """Send daily reports to the subscribers due in a UTC slot (default: all of them)."""
+    subscribers = load_subscribers()
+    if slot is not None:
+        subscribers = group_by_slot(subscribers).get(slot, [])
     logger.info(f"Sending daily report to {len(subscribers)} subscribers")
     
     if not subscribers:
         logger.info("No subscribers to send reports to")
         return
     
-    data = fetch_margin_data()
-    message = format_data_for_telegram(data)
-    
-    for chat_id in subscribers:
-        try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=message,
-                parse_mode="Markdown"
-            )
-            time.sleep(0.5)  # Avoid hitting rate limits
-        except Exception as e:
-            logger.error(f"Error sending message to {chat_id}: {e}")
+    data = await asyncio.to_thread(fetch_margin_data)
+    data_key = snapshot_key(data)
+
+    # Render each distinct report once and send it to every chat that wants it
+    groups = group_by_preferences(subscribers)
+    logger.info(f"Rendering {len(groups)} distinct reports for {len(subscribers)} subscribers")
+    sends = {}
+    for prefs, chat_ids in groups:
+        message = render_report(data, prefs, data_key)
+        for chat_id in chat_ids:
+            sends[chat_id] = outbox.submit(BULK, chat_id, context.bot.send_message,
+                                           chat_id=chat_id, text=message, parse_mode="Markdown")
+    await deliver(sends, "daily report")
+
+async def start_outbox(application: Application) -> None:
+    """Start the outbound queue on the bot's event loop, and remember the loop for scheduler jobs."""
+    _bot_loop["loop"] = asyncio.get_running_loop()
+    await outbox.start()
+
+async def stop_outbox(application: Application) -> None:
+    """Stop the outbound queue when the bot shuts down."""
+    await outbox.stop()
 
 def main() -> None:
     """Run the bot."""
     logger.info("Starting standalone Telegram bot...")
     
-    # Update the cached data at startup
-    update_cached_data()
+    # Update the cached data at startup; this also sets the alert baseline
+    alert_engine.evaluate(update_cached_data())
     
     # Create the Application instance
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)
+        .post_init(start_outbox)
+        .post_shutdown(stop_outbox)
+        .build()
+    )
     
     # Register command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("margin", margin))
     application.add_handler(CommandHandler("subscribe", subscribe))
     application.add_handler(CommandHandler("unsubscribe", unsubscribe))
+    application.add_handler(CommandHandler("alert", alert))
+    application.add_handler(CommandHandler("alerts", list_alerts))
+    application.add_handler(CommandHandler("unalert", unalert))
+    application.add_handler(CommandHandler("watch", watch))
+    application.add_handler(CommandHandler("unwatch", unwatch))
+    application.add_handler(CommandHandler("top", top))
+    application.add_handler(CommandHandler("time", delivery_time))
+    application.add_handler(CommandHandler("settings", settings))
     
-    # Schedule data updates every hour
-    scheduler.add_job(update_cached_data, 'interval', hours=1)
+    # Schedule data updates, adapting the interval after each one
+    scheduler.add_job(scheduled_update, 'interval', seconds=update_cadence.interval,
+                      id="update_cached_data", args=[application])
     
-    # Schedule daily reports at 12:00 UTC
-    scheduler.add_job(
-        lambda: application.create_task(send_daily_report(application)),
-        'cron',
-        hour=12,
-        minute=0
-    )
+    # Schedule daily reports, one job per delivery slot in use. Slots are
+    # re-synced hourly so daylight saving changes move chats to their new slot.
+    sync_report_jobs(application)
+    scheduler.add_job(sync_report_jobs, 'interval', hours=1, args=[application], id="sync_report_jobs")
     
     # Start the scheduler
     scheduler.start()
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Keep the database, archive and quota state of a test run out of the working tree
+_state_dir = tempfile.mkdtemp(prefix="margobot-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_state_dir, 'crypto_data.db')}")
+os.environ.setdefault("ARCHIVE_DIR", os.path.join(_state_dir, "archive"))
+os.environ.setdefault("QUOTA_DB_PATH", os.path.join(_state_dir, "quota.sqlite3"))
+os.environ.setdefault("ANOMALY_STATE_FILE", os.path.join(_state_dir, "anomaly_state.npz"))
+os.environ.setdefault("MAINTENANCE_JOBS_ENABLED", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def app_module():
+    """The app module with empty tables"""
+    import app
+    with app.app.app_context():
+        for table in reversed(app.db.metadata.sorted_tables):
+            app.db.session.execute(table.delete())
+        app.db.session.commit()
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
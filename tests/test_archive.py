@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import archive
+
+def add_row(app_module, timestamp, ratio=2.0):
+    with app_module.app.app_context():
+        app_module.db.session.add(app_module.CryptoData(
+            symbol='BTC', borrow_amount=ratio, repay_amount=1, ratio=ratio, timestamp=timestamp))
+        app_module.db.session.commit()
+
+def test_days_without_rows_are_not_archived(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'ARCHIVE_DIR', str(tmp_path))
+    today = datetime.utcnow().date()
+    first = datetime.combine(today - timedelta(days=20), datetime.min.time()) + timedelta(hours=1)
+    add_row(app_module, first)
+    add_row(app_module, first + timedelta(days=2))
+
+    assert app_module.archive_closed_days(today) == 2
+    assert archive.archived_days(str(tmp_path)) == {first.date(), (first + timedelta(days=2)).date()}
+
+def test_late_rows_for_an_empty_partition_are_read(app_module, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'ARCHIVE_DIR', str(tmp_path))
+    day = datetime.utcnow().date() - timedelta(days=20)
+    # An empty partition, as older versions wrote for gap days
+    archive.write_day(str(tmp_path), day, [])
+    late = datetime.combine(day, datetime.min.time()) + timedelta(hours=5)
+    add_row(app_module, late)
+
+    assert archive.archived_days(str(tmp_path)) == set()
+    with app_module.app.app_context():
+        rows = app_module.read_ratio_rows(late - timedelta(days=1), late + timedelta(days=1), 'BTC')
+    assert [row['timestamp'] for row in rows] == [late]
+
+    response = client.get('/api/export', query_string={'from': (late - timedelta(days=1)).isoformat(),
+                                                       'to': (late + timedelta(days=1)).isoformat()})
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+
+def test_archive_wins_only_for_symbols_it_has(app_module, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'ARCHIVE_DIR', str(tmp_path))
+    day = datetime.utcnow().date() - timedelta(days=20)
+    archived_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=1)
+    archive.write_day(str(tmp_path), day, [('ETH', 3.0, 3.0, 1.0, archived_at)])
+    backfilled = archived_at + timedelta(hours=2)
+    add_row(app_module, backfilled)
+
+    with app_module.app.app_context():
+        btc = app_module.read_ratio_rows(archived_at - timedelta(days=1), archived_at + timedelta(days=1), 'BTC')
+        eth = app_module.read_ratio_rows(archived_at - timedelta(days=1), archived_at + timedelta(days=1), 'ETH')
+    assert [row['timestamp'] for row in btc] == [backfilled]
+    assert [row['timestamp'] for row in eth] == [archived_at]
@@ -0,0 +1,33 @@
+import pytest
+
+import charts
+
+GOOD = [("2026-01-0%d" % day, ["BTC", "ETH"], [20.0, 15.0]) for day in (1, 2, 3)]
+# Mismatched columns make the DataFrame, and so the chart, fail to build
+BAD = ("2026-01-09", ["BTC", "ETH"], [20.0])
+
+@pytest.fixture(scope="module")
+def pool():
+    with charts.lease_pool(2, 100) as pool:
+        yield pool
+    pool.shutdown()
+
+@pytest.mark.parametrize("use_pool", [False, True])
+def test_failed_day_yields_placeholder(use_pool, request):
+    pool = request.getfixturevalue("pool") if use_pool else None
+    cache = charts.DayChartCache()
+    payloads = [GOOD[0], BAD, GOOD[1], GOOD[2]]
+
+    built = list(charts.build_day_charts(payloads, cache, pool))
+
+    assert [day for day, _ in built] == [payload[0] for payload in payloads]
+    assert built[1][1] is None
+    assert all(chart is not None for day, chart in built if day != BAD[0])
+    # The failed day is not cached, so it is retried on the next page load
+    assert cache.get(charts.DayChartCache.key(BAD)) is None
+
+def test_pool_shut_down_under_a_request_falls_back_inline():
+    with charts.lease_pool(1, 100) as pool:
+        pool.shutdown()
+        built = list(charts.build_day_charts(GOOD, charts.DayChartCache(), pool))
+    assert all(chart is not None for _, chart in built)
@@ -0,0 +1,41 @@
+import pytest
+
+import snapshots
+
+DATA = [{'symbol': 'BTC', 'borrow_amount': 20, 'repay_amount': 1, 'ratio': 20.0}]
+
+@pytest.fixture
+def stale_snapshot(app_module, monkeypatch):
+    """A published snapshot that is no longer fresh, with the data path disabled"""
+    snapshot = snapshots.publish_snapshot(DATA, ttl_seconds=0)
+    refreshers = []
+
+    def no_refresh(*args, **kwargs):
+        raise AssertionError("revalidation reached the data path")
+
+    monkeypatch.setattr(app_module, 'get_current_snapshot', no_refresh)
+    monkeypatch.setattr(app_module, 'start_snapshot_refresher', lambda: refreshers.append(True))
+    return snapshot, refreshers
+
+@pytest.mark.parametrize('path, variant', [
+    ('/', 'index'),
+    ('/api/crypto-data', 'api'),
+    ('/api/crypto-data?since=1', 'api-since-1'),
+    ('/history?days=7', 'history-7'),
+])
+def test_revalidation_is_answered_without_refreshing(client, stale_snapshot, path, variant):
+    snapshot, refreshers = stale_snapshot
+    etag = f'"{variant}-{snapshot["id"]}"'
+
+    response = client.get(path, headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    # The stale snapshot is refreshed in the background instead
+    assert refreshers == [True]
+
+def test_if_modified_since_is_answered_without_refreshing(client, stale_snapshot):
+    snapshot, _ = stale_snapshot
+    response = client.get('/api/crypto-data', headers={
+        'If-Modified-Since': snapshot['timestamp'].strftime('%a, %d %b %Y %H:%M:%S GMT')})
+    assert response.status_code == 304
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+SNAPSHOT = [
+    {'symbol': 'BTC', 'borrow_amount': 20, 'repay_amount': 1, 'ratio': 20.0},
+    {'symbol': 'ETH', 'borrow_amount': 15, 'repay_amount': 1, 'ratio': 15.0},
+]
+
+def save_stable_snapshot(app_module, first_seen, last_seen):
+    app_module.save_to_database([(first_seen, SNAPSHOT)])
+    app_module.save_to_database([(last_seen, SNAPSHOT)])
+
+def test_stable_period_is_filled_forward_hourly(app_module):
+    now = datetime.utcnow().replace(microsecond=0)
+    save_stable_snapshot(app_module, now - timedelta(days=3), now)
+
+    with app_module.app.app_context():
+        rows = app_module.read_ratio_rows(now - timedelta(days=4), now, 'BTC')
+
+    hours = [row['timestamp'] for row in rows]
+    assert len(hours) == 73
+    assert hours == sorted(hours)
+    assert {day.date() for day in hours} == {(now - timedelta(days=d)).date() for d in range(4)}
+
+def test_export_streams_heartbeat_rows_lazily(app_module, monkeypatch):
+    now = datetime.utcnow().replace(microsecond=0)
+    save_stable_snapshot(app_module, now - timedelta(days=5), now)
+
+    produced = []
+    heartbeat_rows = app_module.heartbeat_rows
+
+    def counting_heartbeat_rows(*args, **kwargs):
+        for row in heartbeat_rows(*args, **kwargs):
+            produced.append(row)
+            yield row
+
+    monkeypatch.setattr(app_module, 'heartbeat_rows', counting_heartbeat_rows)
+
+    with app_module.app.app_context():
+        rows = app_module.iter_export_rows(now - timedelta(days=6), now)
+        first = list(islice(rows, 5))
+        assert len(first) == 5
+        # Only about as many filled rows as were consumed have been built
+        assert len(produced) <= 10
+
+        remaining = list(rows)
+
+    assert len(first) + len(remaining) == 2 * (5 * 24 + 1)
+    assert len(produced) == 2 * 5 * 24
+
+def test_compaction_keeps_one_sample_per_stable_hour(app_module):
+    now = datetime.utcnow().replace(microsecond=0)
+    save_stable_snapshot(app_module, now - timedelta(days=10), now)
+
+    app_module.compact_history(now)
+
+    with app_module.app.app_context():
+        hourly = app_module.CryptoDataHourly.query.filter_by(symbol='BTC').all()
+        log = app_module.SnapshotLog.query.one()
+        rows = app_module.read_ratio_rows(now - timedelta(days=11), now, 'BTC')
+
+    cutoff = app_module._floor_hour(now - timedelta(days=app_module.RAW_RETENTION_DAYS))
+    assert all(bucket.samples == 1 for bucket in hourly)
+    assert max(bucket.bucket for bucket in hourly) == cutoff - timedelta(hours=1)
+    assert log.first_seen == cutoff
+    # Nothing lost or doubled across the compacted boundary
+    assert len(rows) == 10 * 24 + 1
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+def add_rows(app_module, timestamps, symbol='BTC'):
+    with app_module.app.app_context():
+        for timestamp in timestamps:
+            app_module.db.session.add(app_module.CryptoData(
+                symbol=symbol, borrow_amount=2, repay_amount=1, ratio=2, timestamp=timestamp))
+        app_module.db.session.commit()
+
+def test_history_accepts_z_suffixed_range(app_module, client):
+    now = datetime.utcnow().replace(microsecond=0)
+    add_rows(app_module, [now - timedelta(hours=2)])
+
+    start = (now - timedelta(days=1)).isoformat() + 'Z'
+    response = client.get(f'/api/history/BTC?from={start}')
+
+    assert response.status_code == 200
+    assert response.json['raw_count'] == 1
+    assert response.json['from'] == (now - timedelta(days=1)).isoformat()
+
+def test_export_converts_offsets_to_utc(app_module, client):
+    now = datetime.utcnow().replace(microsecond=0)
+    add_rows(app_module, [now - timedelta(hours=3), now - timedelta(hours=1)])
+
+    # 2 hours ago in UTC, written as local time two hours ahead of UTC
+    start = (now - timedelta(hours=2) + timedelta(hours=2)).isoformat() + '+02:00'
+    response = client.get('/api/export', query_string={'from': start, 'to': now.isoformat() + '+00:00'})
+
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 2
+
+def test_invalid_dates_are_rejected(client):
+    assert client.get('/api/history/BTC?from=yesterday').status_code == 400
+    assert client.get('/api/export?to=2026-13-01').status_code == 400
+
+def test_reversed_range_is_rejected(client):
+    response = client.get('/api/export?from=2026-02-01T00:00:00Z&to=2026-01-01T00:00:00Z')
+    assert response.status_code == 400
+    assert client.get('/api/history/BTC?from=2026-02-01&to=2026-01-01').status_code == 400
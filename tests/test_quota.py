@@ -0,0 +1,42 @@
+import quota
+
+class Offline(Exception):
+    pass
+
+def test_on_demand_calls_stop_at_the_reserve(tmp_path):
+    budget = quota.QuotaBudget(str(tmp_path / 'quota.sqlite3'), 'test', per_minute=10, monthly=1000,
+                               reserve_fraction=0.2)
+
+    on_demand = [budget.acquire(quota.ON_DEMAND) for _ in range(10)]
+    assert on_demand == [True] * 8 + [False] * 2
+
+    # The reserve is still there for scheduled refreshes
+    assert budget.acquire(quota.SCHEDULED)
+    assert budget.acquire(quota.SCHEDULED)
+    assert not budget.acquire(quota.SCHEDULED)
+
+def test_bot_refresh_is_on_demand_unless_scheduled(tmp_path, monkeypatch):
+    import standalone_bot
+
+    budget = quota.QuotaBudget(str(tmp_path / 'quota.sqlite3'), 'test', per_minute=10, monthly=1000,
+                               reserve_fraction=0.2)
+    while budget.acquire(quota.ON_DEMAND):
+        pass
+    monkeypatch.setattr(standalone_bot, 'coingecko_quota', budget)
+    monkeypatch.setattr(standalone_bot, 'DATA_CACHE_FILE', str(tmp_path / 'cache.json'))
+
+    calls = []
+
+    def fake_get(url, **kwargs):
+        calls.append(url)
+        raise Offline(url)
+
+    monkeypatch.setattr(standalone_bot.requests, 'get', fake_get)
+
+    # Only the reserve is left: a user-triggered refresh doesn't touch CoinGecko
+    standalone_bot.fetch_margin_data()
+    assert not any('coingecko' in url for url in calls)
+
+    # A scheduled refresh may still spend the reserve
+    standalone_bot.fetch_margin_data(quota.SCHEDULED)
+    assert any('coingecko' in url for url in calls)
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from write_behind import WriteBehindQueue
+
+def test_full_queue_drops_instead_of_writing_out_of_order():
+    release = threading.Event()
+    written = []
+
+    def handler(batch):
+        release.wait(5)
+        written.extend(batch)
+
+    writer = WriteBehindQueue(handler, maxsize=2, batch_size=10, put_timeout=0.05)
+    assert writer.submit(1)
+    time.sleep(0.05)  # The worker takes item 1 and blocks in the handler
+    assert writer.submit(2)
+    assert writer.submit(3)
+    assert not writer.submit(4)
+
+    assert writer.dropped == 1
+    assert written == []  # Nothing was written on the producer's thread
+    release.set()
+    writer.stop()
+    assert written == [1, 2, 3]
+
+def test_stop_gives_up_on_a_wedged_handler():
+    wedged = threading.Event()
+    writer = WriteBehindQueue(lambda batch: wedged.wait(5), stop_timeout=0.1)
+    writer.submit(1)
+
+    started = time.monotonic()
+    writer.stop()
+    assert time.monotonic() - started < 1
+    wedged.set()
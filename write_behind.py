@@ -0,0 +1,142 @@
+"""
+Module for write-behind persistence of fetched data
+"""
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class WriteBehindQueue:
+    """
+    Bounded queue of pending writes drained by one background worker.
+
+    Producers hand items over with submit() and return immediately; the
+    worker passes them to the handler in batches of up to `batch_size`,
+    in the order they were submitted. When the queue is full, submit()
+    blocks for up to `put_timeout` seconds and then drops the item (counted
+    in `dropped`), so a stalled database slows producers down instead of
+    growing memory without bound. Items are never written from the
+    producer's thread, where they could overtake items still queued.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], None], maxsize: int = 100,
+                 batch_size: int = 10, put_timeout: float = 2.0, stop_timeout: float = 10.0,
+                 name: str = "write-behind"):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.stop_timeout = stop_timeout
+        self.name = name
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker thread if it is not running yet."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                logger.info(f"Started {self.name} worker")
+
+    def submit(self, item: Any) -> bool:
+        """
+        Queue an item for writing.
+
+        Args:
+            item: The item passed to the handler as part of a batch
+
+        Returns:
+            False if the queue stayed full and the item was dropped
+        """
+        self.start()
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning(f"{self.name} queue full for {self.put_timeout}s, dropped an item "
+                           f"({self.dropped} so far)")
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Block until every queued item has been written."""
+        self._queue.join()
+
+    def stop(self) -> None:
+        """
+        Write everything still queued and stop the worker, waiting at most
+        `stop_timeout` seconds so a wedged database can't hang shutdown.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=self.stop_timeout)
+        except queue.Full:
+            logger.warning(f"{self.name} queue still full after {self.stop_timeout}s, "
+                           f"abandoning {self.depth} queued items")
+            return
+        self._thread.join(self.stop_timeout)
+        if self._thread.is_alive():
+            logger.warning(f"{self.name} worker still writing after {self.stop_timeout}s, "
+                           f"abandoning {self.depth} queued items")
+            return
+        logger.info(f"Stopped {self.name} worker")
+
+    @property
+    def depth(self) -> int:
+        """Number of items waiting to be written."""
+        return self._queue.qsize()
+
+    def _handle(self, batch: List[Any]) -> None:
+        try:
+            self.handler(batch)
+        except Exception as e:
+            logger.error(f"{self.name} failed to write {len(batch)} items: {e}")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [] if item is _STOP else [item]
+            stopping = item is _STOP
+            taken = 1
+
+            # Take whatever else is already waiting, up to one batch
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            if batch:
+                self._handle(batch)
+            for _ in range(taken):
+                self._queue.task_done()
+
+            if stopping:
+                # Drain anything queued behind the stop marker
+                remaining = []
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._queue.task_done()
+                    if item is not _STOP:
+                        remaining.append(item)
+                if remaining:
+                    self._handle(remaining)
+                return